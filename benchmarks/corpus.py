@@ -0,0 +1,154 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Deterministic synthetic SVG documents for benchmarking.
+
+The same parameters and seed always produce the same document, so results
+stay comparable across releases.
+"""
+
+import random
+
+
+WIDTH = 1024
+HEIGHT = 768
+
+SHAPES = ('circle', 'ellipse', 'line', 'path', 'polygon', 'polyline', 'rect')
+
+
+class CorpusGenerator(object):
+    """Writes a document of `elements` shapes.
+
+    Shapes are spread round-robin over nested groups `depth` levels deep, each
+    with its own transform. Paths have `path_length` segments and
+    `gradients` linear gradients are shared by the filled shapes.
+    """
+
+    def __init__(self, elements=100, depth=1, path_length=10, gradients=0,
+                 seed=0):
+        self.elements = elements
+        self.depth = depth
+        self.path_length = path_length
+        self.gradients = gradients
+        self.random = random.Random(seed)
+
+    def __coord(self, limit):
+        return '%.2f' % self.random.uniform(0, limit)
+
+    def __point(self):
+        return '%s,%s' % (self.__coord(WIDTH), self.__coord(HEIGHT))
+
+    def __color(self):
+        return '#%06x' % self.random.randrange(0x1000000)
+
+    def __paint(self):
+        if self.gradients and self.random.random() < 0.5:
+            return 'url(#gradient%d)' % self.random.randrange(self.gradients)
+        return self.__color()
+
+    def __style(self):
+        attributes = ['fill="%s"' % self.__paint()]
+        if self.random.random() < 0.5:
+            attributes.append('stroke="%s"' % self.__color())
+            attributes.append('stroke-width="%.1f"' %
+                              self.random.uniform(0.5, 4))
+        return ' '.join(attributes)
+
+    def __path_data(self):
+        commands = ['M%s' % self.__point()]
+        for i in range(self.path_length):
+            kind = self.random.random()
+            if kind < 0.4:
+                commands.append('L%s' % self.__point())
+            elif kind < 0.8:
+                commands.append('C%s %s %s' % (self.__point(), self.__point(),
+                                               self.__point()))
+            else:
+                commands.append('Q%s %s' % (self.__point(), self.__point()))
+        commands.append('Z')
+        return ' '.join(commands)
+
+    def __shape(self, index):
+        kind = SHAPES[index % len(SHAPES)]
+        style = self.__style()
+        if kind == 'circle':
+            return '<circle cx="%s" cy="%s" r="%s" %s/>' % (
+                self.__coord(WIDTH), self.__coord(HEIGHT), self.__coord(50),
+                style)
+        elif kind == 'ellipse':
+            return '<ellipse cx="%s" cy="%s" rx="%s" ry="%s" %s/>' % (
+                self.__coord(WIDTH), self.__coord(HEIGHT), self.__coord(80),
+                self.__coord(40), style)
+        elif kind == 'line':
+            return '<line x1="%s" y1="%s" x2="%s" y2="%s" stroke="%s"/>' % (
+                self.__coord(WIDTH), self.__coord(HEIGHT), self.__coord(WIDTH),
+                self.__coord(HEIGHT), self.__color())
+        elif kind == 'path':
+            return '<path d="%s" %s/>' % (self.__path_data(), style)
+        elif kind == 'polygon' or kind == 'polyline':
+            points = ' '.join(self.__point()
+                              for i in range(max(self.path_length, 3)))
+            return '<%s points="%s" %s/>' % (kind, points, style)
+        return '<rect x="%s" y="%s" width="%s" height="%s" %s/>' % (
+            self.__coord(WIDTH), self.__coord(HEIGHT), self.__coord(200),
+            self.__coord(200), style)
+
+    def __transform(self):
+        kind = self.random.random()
+        if kind < 0.4:
+            return 'translate(%s %s)' % (self.__coord(20), self.__coord(20))
+        elif kind < 0.7:
+            return 'scale(%.3f)' % self.random.uniform(0.8, 1.2)
+        return 'rotate(%.1f %s %s)' % (self.random.uniform(-30, 30),
+                                      self.__coord(WIDTH),
+                                      self.__coord(HEIGHT))
+
+    def iter_lines(self):
+        """Yields the lines of the document."""
+        yield '<?xml version="1.0" encoding="UTF-8"?>'
+        yield ('<svg xmlns="http://www.w3.org/2000/svg" width="%d" '
+               'height="%d" viewBox="0 0 %d %d">' %
+               (WIDTH, HEIGHT, WIDTH, HEIGHT))
+        if self.gradients:
+            yield '<defs>'
+            for i in range(self.gradients):
+                yield ('<linearGradient id="gradient%d" x1="%s" y1="%s" '
+                       'x2="%s" y2="%s" gradientUnits="userSpaceOnUse">' %
+                       (i, self.__coord(WIDTH), self.__coord(HEIGHT),
+                        self.__coord(WIDTH), self.__coord(HEIGHT)))
+                yield '<stop offset="0" stop-color="%s"/>' % self.__color()
+                yield '<stop offset="1" stop-color="%s"/>' % self.__color()
+                yield '</linearGradient>'
+            yield '</defs>'
+
+        # Each top-level group holds a chain of `depth` nested groups, the
+        # shapes are distributed over the innermost ones.
+        chains = max(1, min(self.elements // max(self.depth, 1), 32))
+        for chain in range(chains):
+            for level in range(self.depth):
+                yield '<g transform="%s">' % self.__transform()
+            for index in range(chain, self.elements, chains):
+                yield self.__shape(index)
+            for level in range(self.depth):
+                yield '</g>'
+        yield '</svg>'
+
+    def generate(self):
+        return '\n'.join(self.iter_lines()) + '\n'
+
+
+def generate(elements=100, depth=1, path_length=10, gradients=0, seed=0):
+    """Returns a synthetic SVG document as a string."""
+    return CorpusGenerator(elements, depth, path_length, gradients,
+                           seed).generate()
@@ -0,0 +1,112 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Compares handler lookup through `SVGParser`'s registries with the
+`isinstance` chains they replaced.
+
+Only the lookup is timed, the handlers aren't called:
+
+    python -m benchmarks.dispatch
+"""
+
+import argparse
+import io
+import json
+import time
+
+import svgelements
+
+from benchmarks import corpus
+from svg2nvg.parser import SVGParser
+
+
+parser = argparse.ArgumentParser(description='svg2nvg dispatch benchmark')
+parser.add_argument('-r', '--repeat', type=int, default=5,
+                    help='the number of timed runs')
+parser.add_argument('-e', '--elements', type=int, default=10000,
+                    help='the number of elements in the synthetic document')
+
+
+def lookup_element_by_chain(child):
+    if isinstance(child, svgelements.Circle):
+        return 'circle'
+    elif isinstance(child, svgelements.Ellipse):
+        return 'ellipse'
+    elif isinstance(child, svgelements.Group):
+        return 'group'
+    elif isinstance(child, svgelements.Path):
+        return 'path'
+    elif isinstance(child, svgelements.Polygon):
+        return 'polygon'
+    elif isinstance(child, svgelements.Polyline):
+        return 'polyline'
+    elif isinstance(child, svgelements.Rect):
+        return 'rect'
+    elif isinstance(child, svgelements.SimpleLine):
+        return 'line'
+    elif isinstance(child, svgelements.SVGElement):
+        return 'other'
+    return None
+
+def lookup_segment_by_chain(segment):
+    if isinstance(segment, svgelements.Arc):
+        return 'arc'
+    elif isinstance(segment, svgelements.Close):
+        return 'close'
+    elif isinstance(segment, svgelements.CubicBezier):
+        return 'cubic_bezier'
+    elif isinstance(segment, svgelements.Line):
+        return 'line'
+    elif isinstance(segment, svgelements.Move):
+        return 'move'
+    elif isinstance(segment, svgelements.QuadraticBezier):
+        return 'quadratic_bezier'
+    return None
+
+def time_lookups(function, objects, repeat):
+    timings = list()
+    for i in range(repeat):
+        start_time = time.perf_counter()
+        for obj in objects:
+            function(obj)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+def main():
+    args = parser.parse_args()
+    svg = svgelements.SVG.parse(
+        io.StringIO(corpus.generate(args.elements, depth=4, path_length=20)),
+        color=None)
+    elements = list(svg.elements())
+    segments = [segment for element in elements
+                if isinstance(element, svgelements.Path)
+                for segment in element]
+
+    element_lookup = SVGParser.element_handlers.lookup
+    segment_lookup = SVGParser.segment_handlers.lookup
+    results = dict()
+    for name, objects, chain, registry in (
+            ('elements', elements, lookup_element_by_chain,
+             lambda child: element_lookup(type(child))),
+            ('segments', segments, lookup_segment_by_chain,
+             lambda segment: segment_lookup(type(segment)))):
+        results[name] = dict(
+            count=len(objects),
+            chain=time_lookups(chain, objects, args.repeat),
+            registry=time_lookups(registry, objects, args.repeat))
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
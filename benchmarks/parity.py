@@ -0,0 +1,170 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Checks that `SVGParser.parse_stream()` draws the same as `parse()`.
+
+`svg2nvg.stream` rebuilds the svgelements objects that
+`svgelements.SVG.parse()` would create, including the CSS cascade,
+`currentColor` and viewport transforms, so an svgelements upgrade can make
+both diverge. The fixtures, synthetic documents of `benchmarks.corpus` and a
+few documents exercising these details are converted both ways, with and
+without culling:
+
+    python -m benchmarks.parity
+
+Exits with status 1 if any output differs, which makes it usable in CI.
+"""
+
+import argparse
+import difflib
+import io
+import os
+import sys
+
+import svgelements
+
+from benchmarks import corpus
+from svg2nvg.parser import SVGParser
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# (name, generator parameters) pairs.
+CORPUS_DOCUMENTS = (
+    ('elements-500', dict(elements=500)),
+    ('depth-16', dict(elements=300, depth=16, seed=1)),
+    ('path-length-200', dict(elements=50, path_length=200, seed=2)),
+    ('gradients-20', dict(elements=300, gradients=20, seed=3)),
+    ('mixed', dict(elements=400, depth=4, path_length=30, gradients=5,
+                   seed=4)),
+)
+
+# (name, document) pairs covering what `svg2nvg.stream` reimplements.
+DOCUMENTS = (
+    ('css', '''<svg xmlns="http://www.w3.org/2000/svg"
+  width="100" height="100">
+  <style>
+    .a { fill: #336699; stroke: red; stroke-width: 2 }
+    #b { fill: none; stroke: blue }
+    rect { stroke-linejoin: round }
+  </style>
+  <rect class="a" x="10" y="10" width="30" height="20"/>
+  <circle id="b" cx="60" cy="60" r="15" style="stroke-width: 3"/>
+  <g class="a"><path d="M0 0 L50 50 L0 50 Z" fill="green"/></g>
+</svg>'''),
+    ('current-color', '''<svg xmlns="http://www.w3.org/2000/svg"
+  width="100" height="100" color="red">
+  <g color="#00ff00">
+    <rect x="0" y="0" width="10" height="10" fill="currentColor"/>
+    <circle cx="50" cy="50" r="10" stroke="currentColor"
+      fill="none"/>
+  </g>
+  <path d="M10 80 H90" stroke="currentColor"/>
+</svg>'''),
+    ('view-box', '''<svg xmlns="http://www.w3.org/2000/svg"
+  width="200" height="100" viewBox="10 20 50 50"
+  preserveAspectRatio="xMaxYMin slice">
+  <rect x="10" y="20" width="50" height="50" fill="#123456"/>
+  <g transform="rotate(15 35 45)">
+    <ellipse cx="35" cy="45" rx="20" ry="10"/>
+  </g>
+</svg>'''),
+    ('nested-svg', '''<svg xmlns="http://www.w3.org/2000/svg"
+  width="300" height="200">
+  <svg x="20" y="30" width="100" height="50" viewBox="0 0 10 5">
+    <polygon points="0,0 10,0 5,5" fill="orange"/>
+  </svg>
+  <svg x="150" y="0" width="40%" height="50%" viewBox="0 0 20 20"
+    preserveAspectRatio="none">
+    <polyline points="0,0 20,10 0,20" stroke="black" fill="none"/>
+  </svg>
+</svg>'''),
+    ('units', '''<svg xmlns="http://www.w3.org/2000/svg"
+  width="10cm" height="5cm" viewBox="0 0 100 50">
+  <line x1="0" y1="0" x2="100" y2="50" stroke="#000"
+    stroke-width="0.5mm"/>
+  <rect x="10%" y="10%" width="20%" height="30%" rx="2" fill-opacity="0.5"/>
+</svg>'''),
+    ('gradient-units', '''<svg xmlns="http://www.w3.org/2000/svg"
+  width="100" height="100">
+  <rect x="0" y="0" width="50" height="50" fill="url(#late)"/>
+  <defs>
+    <linearGradient id="late" x1="0" y1="0" x2="1" y2="1">
+      <stop offset="0" stop-color="red"/>
+      <stop offset="1" stop-color="blue"/>
+    </linearGradient>
+    <linearGradient id="user" gradientUnits="userSpaceOnUse"
+      x1="0" y1="0" x2="100" y2="0" href="#late"/>
+  </defs>
+  <path d="M50 50 C 60 90 90 60 100 100 Z" fill="url(#user)"/>
+</svg>'''),
+)
+
+
+parser = argparse.ArgumentParser(description='svg2nvg stream parity check')
+parser.add_argument('-f', '--filter', default='',
+                    help='only check documents whose name contains this')
+
+
+def iter_documents():
+    for filename in sorted(os.listdir(FIXTURES_DIR)):
+        if filename.endswith('.svg'):
+            with open(os.path.join(FIXTURES_DIR, filename)) as fileobj:
+                yield 'fixture-%s' % filename[:-4], fileobj.read()
+    for name, params in CORPUS_DOCUMENTS:
+        yield 'corpus-%s' % name, corpus.generate(**params)
+    for name, document in DOCUMENTS:
+        yield name, document
+
+def convert(document, culls, streams):
+    svg_parser = SVGParser(culls=culls)
+    source = io.BytesIO(document.encode('utf-8'))
+    if streams:
+        svg_parser.parse_stream(source)
+    else:
+        svg_parser.parse(source)
+    return svg_parser.get_content()
+
+def check(name, document):
+    """Returns the lines of a diff of both outputs, which are empty if the
+    outputs are the same.
+    """
+    diff = list()
+    for culls in (False, True):
+        expected = convert(document, culls, False).splitlines()
+        actual = convert(document, culls, True).splitlines()
+        diff.extend(difflib.unified_diff(
+            expected, actual, '%s parse()' % name,
+            '%s parse_stream()' % name, lineterm='', n=1))
+    return diff
+
+def main():
+    args = parser.parse_args()
+    failures = 0
+    for name, document in iter_documents():
+        if args.filter not in name:
+            continue
+        diff = check(name, document)
+        sys.stderr.write('%-24s %s\n' % (name, 'FAILED' if diff else 'ok'))
+        for line in diff[:20]:
+            sys.stderr.write('  %s\n' % line)
+        failures += bool(diff)
+    sys.stderr.write('svgelements %s: %d documents differ\n' %
+                     (svgelements.SVGELEMENTS_VERSION, failures))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Measures conversion throughput on synthetic and fixture SVGs.
+
+Each benchmark times four phases separately:
+
+* `svg_parse`: `svgelements.SVG.parse()`.
+* `walk`: `SVGParser.parse()` on the already parsed document.
+* `header` and `source`: rendering the header and source file contents.
+
+Timings are the minimum and median of `--repeat` runs. Peak memory of each
+phase, on top of what earlier phases hold, is measured in a separate run
+under `tracemalloc` so it doesn't skew the timings. Results are written as JSON:
+
+    python -m benchmarks.run -o results.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import svgelements
+
+from benchmarks import corpus
+from svg2nvg.parser import SVGParser
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+PHASES = ('svg_parse', 'walk', 'header', 'source')
+
+# (name, generator parameters) pairs, each axis is scaled separately.
+SYNTHETIC_BENCHMARKS = (
+    ('elements-100', dict(elements=100)),
+    ('elements-1000', dict(elements=1000)),
+    ('elements-10000', dict(elements=10000)),
+    ('depth-8', dict(elements=1000, depth=8)),
+    ('depth-32', dict(elements=1000, depth=32)),
+    ('path-length-100', dict(elements=100, path_length=100)),
+    ('path-length-1000', dict(elements=100, path_length=1000)),
+    ('gradients-10', dict(elements=1000, gradients=10)),
+    ('gradients-100', dict(elements=1000, gradients=100)),
+)
+
+QUICK_BENCHMARKS = (
+    ('elements-100', dict(elements=100)),
+    ('depth-8', dict(elements=100, depth=8)),
+    ('path-length-100', dict(elements=20, path_length=100)),
+    ('gradients-10', dict(elements=100, gradients=10)),
+)
+
+
+parser = argparse.ArgumentParser(description='svg2nvg benchmarks')
+parser.add_argument('-r', '--repeat', type=int, default=5,
+                    help='the number of timed runs per benchmark')
+parser.add_argument('-f', '--filter', default='',
+                    help='only run benchmarks whose name contains this')
+parser.add_argument('-o', '--output',
+                    help='write the JSON results to this file instead of '
+                         'stdout')
+parser.add_argument('-q', '--quick', action='store_true',
+                    help='run a reduced set of small benchmarks')
+
+
+class Benchmark(object):
+    """Converts a single SVG document phase by phase."""
+
+    def __init__(self, name, source, params=None):
+        self.name = name
+        self.source = source
+        self.params = params or dict()
+
+    def __run_phases(self, measure):
+        svg = measure('svg_parse', svgelements.SVG.parse,
+                      io.StringIO(self.source), color=None)
+        svg_parser = SVGParser()
+        measure('walk', svg_parser.parse, svg)
+        measure('header', svg_parser.get_header_file_content,
+                '%s.h' % self.name, 'nanovg.h')
+        measure('source', svg_parser.get_source_file_content,
+                '%s.cc' % self.name, 'nanovg.h')
+        return svg_parser
+
+    def time(self):
+        """Returns the elapsed seconds of each phase in a single run."""
+        timings = dict()
+
+        def measure(phase, function, *args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            timings[phase] = time.perf_counter() - start
+            return result
+
+        svg_parser = self.__run_phases(measure)
+        return timings, len(svg_parser.ops)
+
+    def trace(self):
+        """Returns the peak memory in bytes each phase allocates on top of
+        what earlier phases hold.
+        """
+        peaks = dict()
+
+        def measure(phase, function, *args, **kwargs):
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            result = function(*args, **kwargs)
+            peaks[phase] = tracemalloc.get_traced_memory()[1] - start
+            return result
+
+        tracemalloc.start()
+        try:
+            self.__run_phases(measure)
+        finally:
+            tracemalloc.stop()
+        return peaks
+
+    def run(self, repeat):
+        runs = list()
+        for i in range(repeat):
+            timings, call_count = self.time()
+            runs.append(timings)
+        result = dict(name=self.name, params=self.params,
+                      size=len(self.source), calls=call_count)
+        result['seconds'] = dict(
+            (phase, dict(min=min(run[phase] for run in runs),
+                         median=statistics.median(run[phase]
+                                                  for run in runs)))
+            for phase in PHASES)
+        result['peak_memory'] = self.trace()
+        return result
+
+
+def iter_benchmarks(quick=False):
+    for name, params in QUICK_BENCHMARKS if quick else SYNTHETIC_BENCHMARKS:
+        yield Benchmark(name, corpus.generate(**params), params)
+    for filename in sorted(os.listdir(FIXTURES_DIR)):
+        if filename.endswith('.svg'):
+            with open(os.path.join(FIXTURES_DIR, filename)) as fileobj:
+                yield Benchmark('fixture-%s' % filename[:-4], fileobj.read())
+
+def run(args):
+    results = list()
+    for benchmark in iter_benchmarks(args.quick):
+        if args.filter not in benchmark.name:
+            continue
+        result = benchmark.run(max(args.repeat, 1))
+        sys.stderr.write('%-24s %s\n' % (benchmark.name, '  '.join(
+            '%s %.4fs' % (phase, result['seconds'][phase]['min'])
+            for phase in PHASES)))
+        results.append(result)
+    return dict(python=platform.python_version(),
+                svgelements=svgelements.SVGELEMENTS_VERSION,
+                platform=platform.platform(),
+                repeat=args.repeat,
+                benchmarks=results)
+
+def main():
+    args = parser.parse_args()
+    report = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fileobj:
+            fileobj.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Measures the startup time of the `svg2nvg` command.
+
+Every scenario runs `bin/svg2nvg` in a fresh interpreter. The median time on
+top of a bare interpreter (`python -c pass`) is checked against a budget, so
+the result doesn't depend on how fast the machine starts Python. Scenarios
+that must not import svgelements are also checked with `-X importtime`:
+
+    python -m benchmarks.startup --budget 50
+
+Exits with status 1 if a check fails, which makes it usable in CI.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH = os.path.join(ROOT_DIR, 'svg2nvg', 'bin', 'svg2nvg')
+FIXTURE_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'fixtures', 'icons.svg')
+
+# The modules that are only imported once an SVG file is actually parsed.
+DEFERRED_MODULES = ('svgelements', 'svg2nvg.parser')
+
+# (name, arguments, whether deferred modules must stay unimported) tuples.
+# `{dest}` and `{cache}` are replaced with temporary directories.
+SCENARIOS = (
+    ('help', ['--help'], True),
+    ('argument-error', ['--precision', 'x', FIXTURE_PATH], True),
+    ('cache-hit', [FIXTURE_PATH, '--source_file', '-d', '{dest}',
+                   '--cache_dir', '{cache}'], True),
+    ('convert', [FIXTURE_PATH, '--source_file', '-d', '{dest}'], False),
+)
+
+
+parser = argparse.ArgumentParser(description='svg2nvg startup benchmark')
+parser.add_argument('-r', '--repeat', type=int, default=10,
+                    help='the number of timed runs per scenario')
+parser.add_argument('-b', '--budget', type=float, default=50,
+                    help='the allowed milliseconds on top of interpreter '
+                         'startup for scenarios that skip parsing')
+parser.add_argument('-o', '--output',
+                    help='write the JSON results to this file instead of '
+                         'stdout')
+
+
+def get_environment():
+    environment = dict(os.environ)
+    paths = [ROOT_DIR] + [path for path in
+                          environment.get('PYTHONPATH', '').split(os.pathsep)
+                          if path]
+    environment['PYTHONPATH'] = os.pathsep.join(paths)
+    return environment
+
+def time_command(command, repeat):
+    """Returns the median seconds it takes to run `command`."""
+    environment = get_environment()
+    timings = list()
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.call(command, env=environment, stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def get_imported_modules(command):
+    """Returns the names of all modules `command` imports."""
+    output = subprocess.run(
+        [command[0], '-X', 'importtime'] + command[1:], env=get_environment(),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True).stderr
+    modules = set()
+    for line in output.splitlines():
+        if line.startswith('import time:') and line.count('|') == 2:
+            modules.add(line.rsplit('|', 1)[1].strip())
+    return modules
+
+def run(args):
+    temp_dir = tempfile.mkdtemp()
+    try:
+        dest_dir = os.path.join(temp_dir, 'dest')
+        cache_dir = os.path.join(temp_dir, 'cache')
+        os.mkdir(dest_dir)
+        baseline = time_command([sys.executable, '-c', 'pass'], args.repeat)
+        results = list()
+        for name, arguments, defers in SCENARIOS:
+            arguments = [argument.format(dest=dest_dir, cache=cache_dir)
+                         for argument in arguments]
+            command = [sys.executable, SCRIPT_PATH] + arguments
+            # Fills the cache and the bytecode caches.
+            time_command(command, 1)
+            overhead = (time_command(command, args.repeat) - baseline) * 1000
+            result = dict(name=name, milliseconds=overhead, passed=True)
+            if defers:
+                imported = sorted(set(DEFERRED_MODULES) &
+                                  get_imported_modules(command))
+                result['budget'] = args.budget
+                result['deferred_imports'] = imported
+                result['passed'] = overhead <= args.budget and not imported
+            sys.stderr.write('%-16s %7.1fms %s\n' % (
+                name, overhead, '' if result['passed'] else 'FAILED'))
+            results.append(result)
+    finally:
+        shutil.rmtree(temp_dir)
+    return dict(python=sys.version.split()[0],
+                interpreter_milliseconds=baseline * 1000,
+                repeat=args.repeat,
+                scenarios=results)
+
+def main():
+    args = parser.parse_args()
+    results = run(args)
+    report = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fileobj:
+            fileobj.write(report + '\n')
+    else:
+        print(report)
+    if not all(result['passed'] for result in results['scenarios']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -61,13 +61,13 @@ for dirpath, dirnames, filenames in os.walk(svg2nvg_dir):
 
 setup(
     name='svg2nvg',
-    version='0.1',
+    version='0.1',  # Keep in sync with svg2nvg.__version__.
     description='A tool for converting SVG files to nanovg source code',
     author='Olli Wang',
     author_email='olliwang@ollix.com',
     license='Apache License Version 2.0',
     packages=packages,
-    scripts=['svg2nvg/bin/svg2nvg'],
+    scripts=['svg2nvg/bin/svg2nvg', 'svg2nvg/bin/svg2nvg-client'],
     classifiers=[
         'Development Status :: 3 - Aplha',
         'Intended Audience :: Developers',
@@ -0,0 +1,221 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Bounding boxes of paths with many segments.
+
+`get_path_bbox()` returns exactly what `svgelements.Path.bbox()` returns for
+an untransformed path, using the same formulas in the same order, but without
+creating a `Point` per curve extremum. Without NumPy, svgelements also tries
+to import it for every extremum, which makes culling a path of 10^5 curves
+take minutes.
+
+When NumPy is installed, the coordinates of all lines, quadratic and cubic
+Beziers are collected into contiguous arrays and their extrema are computed
+in bulk. Elementwise arithmetic gives the same results as with Python floats,
+only the order in which `min()` and `max()` compare equal values can differ.
+That only matters for zeros of different signs and NaNs, so such results are
+computed without NumPy again.
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import svgelements
+
+
+# Paths with fewer segments are faster without NumPy.
+MIN_VECTORIZED_SEGMENTS = 64
+
+
+def get_quadratic_extrema(a0, a1, a2):
+    """Returns the coordinates of a quadratic Bezier axis to compare, like
+    `svgelements.QuadraticBezier.bbox()`.
+    """
+    n = a0 - a1
+    d = a0 - 2 * a1 + a2
+    if d != 0:
+        t = n / float(d)
+    else:
+        t = 0.5
+    if 0 < t < 1:
+        n_pos = 1 - t
+        return (a0, a2,
+                n_pos * n_pos * a0 + 2 * (n_pos * t) * a1 + t * t * a2)
+    return (a0, a2)
+
+def get_cubic_point(t, a0, a1, a2, a3):
+    """Returns the coordinate of a cubic Bezier axis at `t`, like
+    `svgelements.CubicBezier.npoint()`.
+    """
+    pos_3 = t * t * t
+    n_pos = 1 - t
+    n_pos_3 = n_pos * n_pos * n_pos
+    pos_2_n_pos = t * t * n_pos
+    n_pos_2_pos = n_pos * n_pos * t
+    return n_pos_3 * a0 + 3 * (n_pos_2_pos * a1 + pos_2_n_pos * a2) + \
+           pos_3 * a3
+
+def get_cubic_extrema(a0, a1, a2, a3):
+    """Returns the coordinates of a cubic Bezier axis to compare, like
+    `svgelements.CubicBezier._real_minmax()`.
+    """
+    extremizers = [0, 1]
+    denom = a0 - 3 * a1 + 3 * a2 - a3
+    if abs(denom) >= 1e-8:
+        delta = a1 * a1 - (a0 + a1) * a2 + a2 * a2 + (a0 - a1) * a3
+        if delta >= 0:
+            sqdelta = math.sqrt(delta)
+            tau = a0 - 2 * a1 + a2
+            r1 = (tau + sqdelta) / denom
+            r2 = (tau - sqdelta) / denom
+            if 0 < r1 < 1:
+                extremizers.append(r1)
+            if 0 < r2 < 1:
+                extremizers.append(r2)
+    else:
+        c = a1 - a0
+        b = 2 * (a0 - 2 * a1 + a2)
+        if b != 0:
+            r0 = -c / b
+            if 0 < r0 < 1:
+                extremizers.append(r0)
+    return [get_cubic_point(t, a0, a1, a2, a3) for t in extremizers]
+
+def get_segment_bbox(segment):
+    """Returns `segment.bbox()`."""
+    if isinstance(segment, svgelements.CubicBezier):
+        start, control1, control2, end = (segment.start, segment.control1,
+                                          segment.control2, segment.end)
+        xs = get_cubic_extrema(start.x, control1.x, control2.x, end.x)
+        ys = get_cubic_extrema(start.y, control1.y, control2.y, end.y)
+        return min(xs), min(ys), max(xs), max(ys)
+    if isinstance(segment, svgelements.QuadraticBezier):
+        start, control, end = segment.start, segment.control, segment.end
+        xs = get_quadratic_extrema(start.x, control.x, end.x)
+        ys = get_quadratic_extrema(start.y, control.y, end.y)
+        return min(xs), min(ys), max(xs), max(ys)
+    return segment.bbox()
+
+def get_path_bbox(path):
+    """Returns `path.bbox(transformed=False)` of an `svgelements.Path`."""
+    segments = path.segments(transformed=False)
+    if numpy is not None and len(segments) >= MIN_VECTORIZED_SEGMENTS:
+        bbox = get_vectorized_bbox(segments)
+        if bbox is not None:
+            return bbox
+
+    bboxes = [get_segment_bbox(segment) for segment in segments]
+    if not bboxes:
+        return None
+    xmins, ymins, xmaxs, ymaxs = zip(*bboxes)
+    # Like svgelements, which adds a stroke width of 0.0 and so turns a
+    # maximum of -0.0 into 0.0.
+    return (min(xmins) - 0.0, min(ymins) - 0.0, max(xmaxs) + 0.0,
+            max(ymaxs) + 0.0)
+
+def get_vectorized_cubic_extrema(a0, a1, a2, a3):
+    """Returns a list of arrays with the coordinates of cubic Bezier axes to
+    compare, see `get_cubic_extrema()`.
+    """
+    values = [get_cubic_point(0.0, a0, a1, a2, a3),
+              get_cubic_point(1.0, a0, a1, a2, a3)]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        denom = a0 - 3 * a1 + 3 * a2 - a3
+        delta = a1 * a1 - (a0 + a1) * a2 + a2 * a2 + (a0 - a1) * a3
+        sqdelta = numpy.sqrt(numpy.where(delta >= 0, delta, 0))
+        tau = a0 - 2 * a1 + a2
+        has_roots = (numpy.abs(denom) >= 1e-8) & (delta >= 0)
+        c = a1 - a0
+        b = 2 * (a0 - 2 * a1 + a2)
+        has_root = (numpy.abs(denom) < 1e-8) & (b != 0)
+        for t, valid in (((tau + sqdelta) / denom, has_roots),
+                         ((tau - sqdelta) / denom, has_roots),
+                         (-c / b, has_root)):
+            valid = valid & (0 < t) & (t < 1)
+            point = get_cubic_point(numpy.where(valid, t, 0.0), a0, a1, a2,
+                                    a3)
+            # The start point stands in for missing extrema.
+            values.append(numpy.where(valid, point, values[0]))
+    return values
+
+def get_vectorized_quadratic_extrema(a0, a1, a2):
+    """Returns a list of arrays with the coordinates of quadratic Bezier axes
+    to compare, see `get_quadratic_extrema()`.
+    """
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        d = a0 - 2 * a1 + a2
+        t = numpy.where(d != 0, (a0 - a1) / d, 0.5)
+        valid = (0 < t) & (t < 1)
+        t = numpy.where(valid, t, 0.0)
+        n_pos = 1 - t
+        point = n_pos * n_pos * a0 + 2 * (n_pos * t) * a1 + t * t * a2
+    return [a0, a2, numpy.where(valid, point, a0)]
+
+def get_vectorized_bbox(segments):
+    """Returns the bounding box of path segments computed in bulk, or `None`
+    if the result may differ from `get_path_bbox()` without NumPy.
+    """
+    # Coordinates compared as is, and the start, control and end points of
+    # curves, as flat x, y sequences.
+    points = list()
+    quadratics = list()
+    cubics = list()
+    for segment in segments:
+        if isinstance(segment, svgelements.CubicBezier):
+            start, control1, control2, end = (
+                segment.start, segment.control1, segment.control2,
+                segment.end)
+            cubics.extend((start.x, start.y, control1.x, control1.y,
+                           control2.x, control2.y, end.x, end.y))
+        elif isinstance(segment, svgelements.QuadraticBezier):
+            start, control, end = (segment.start, segment.control,
+                                   segment.end)
+            quadratics.extend((start.x, start.y, control.x, control.y,
+                               end.x, end.y))
+        elif isinstance(segment, svgelements.Linear):
+            if segment.start is not None:
+                points.extend((segment.start.x, segment.start.y))
+            points.extend((segment.end.x, segment.end.y))
+        else:
+            points.extend(segment.bbox())
+    if not points and not quadratics and not cubics:
+        return None
+
+    xs = list()
+    ys = list()
+    if points:
+        points = numpy.array(points, dtype=float).reshape(-1, 2)
+        xs.append(points[:, 0])
+        ys.append(points[:, 1])
+    for coordinates, count, get_extrema in (
+            (quadratics, 3, get_vectorized_quadratic_extrema),
+            (cubics, 4, get_vectorized_cubic_extrema)):
+        if coordinates:
+            coordinates = numpy.array(coordinates, dtype=float)
+            coordinates = coordinates.reshape(-1, count, 2)
+            xs.extend(get_extrema(*coordinates[:, :, 0].T))
+            ys.extend(get_extrema(*coordinates[:, :, 1].T))
+
+    bbox = (min(values.min() for values in xs),
+            min(values.min() for values in ys),
+            max(values.max() for values in xs),
+            max(values.max() for values in ys))
+    bbox = tuple(float(value) for value in bbox)
+    if not all(math.isfinite(value) and value != 0 for value in bbox):
+        return None
+    return bbox
@@ -0,0 +1,142 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Converts many SVG files into a single translation unit.
+
+Every drawing keeps its own render function, but the data the drawings have
+in common is emitted once:
+
+* All colors live in one `static const NVGcolor` table and are referenced by
+  index.
+* Runs of path building calls that are identical after moving them to their
+  origin, or after an affine transform, become shared `static` subroutines,
+  see the `subroutines` module.
+"""
+
+import os
+
+from svg2nvg import oplist
+from svg2nvg import subroutines
+from svg2nvg.parser import get_parameters
+from svg2nvg.parser import get_title
+
+
+MIN_SUBROUTINE_LENGTH = subroutines.MIN_LENGTH
+
+
+class Bundle(object):
+
+    def __init__(self, context='context', culls=False,
+                 min_subroutine_length=MIN_SUBROUTINE_LENGTH):
+        self.context = context
+        self.culls = culls
+        self.min_subroutine_length = min_subroutine_length
+        # (filename, OpList, width, height) tuples in the order added.
+        self.drawings = list()
+
+    def __len__(self):
+        return len(self.drawings)
+
+    def add(self, filename, ops, width, height):
+        """Adds the recorded calls of a drawing, see `SVGParser.ops`."""
+        self.drawings.append((filename, ops, width, height))
+
+    def __analyze(self):
+        """Collects the shared colors and subroutines.
+
+        Returns a `(colors, subroutines, replacements)` tuple. `colors` is
+        the `oplist.get_color_table()` of all drawings, `subroutines` is a
+        `subroutines.Subroutines` and `replacements` holds the
+        `oplist.iter_stmts()` replacements of each drawing.
+        """
+        colors = oplist.get_color_table(ops for filename, ops, width, height
+                                        in self.drawings)
+        shared_runs = subroutines.Subroutines(self.context,
+                                              self.min_subroutine_length)
+        for filename, ops, width, height in self.drawings:
+            shared_runs.add(ops)
+        return colors, shared_runs, shared_runs.get_replacements()
+
+    def write_header_file(self, output, filename, nanovg_include_path,
+                          namespace='', baseclass='', builds_object=False):
+        """Writes a header declaring the render function of every drawing."""
+        basename = os.path.splitext(os.path.basename(filename))[0]
+        guard_constant = 'SVG2NVG_%s_H_' % basename.upper()
+        output.write('#ifndef %s\n' % guard_constant)
+        output.write('#define %s\n\n' % guard_constant)
+        if nanovg_include_path:
+            output.write('#include "%s"\n\n' % nanovg_include_path)
+        if namespace:
+            output.write('namespace %s {\n\n' % namespace)
+
+        parameters = get_parameters(self.context, self.culls)
+        for drawing_filename, ops, width, height in self.drawings:
+            title = get_title(drawing_filename)
+            if builds_object:
+                inheritance = ' : public %s' % baseclass if baseclass else ''
+                output.write('class %s%s {\n' % (title, inheritance))
+                output.write(' public:\n')
+                output.write('  double GetWidth() const final '
+                             '{ return %s; }\n' % width)
+                output.write('  double GetHeight() const final '
+                             '{ return %s; }\n\n' % height)
+                output.write('  void Draw(%s) const final;\n' % parameters)
+                output.write('};\n\n')
+            else:
+                output.write('void Render%s(%s);\n' % (title, parameters))
+
+        if not builds_object:
+            output.write('\n')
+        if namespace:
+            output.write('}  // namespace %s\n\n' % namespace)
+        output.write('#endif  // %s\n' % guard_constant)
+
+    def write_source_file(self, output, filename, nanovg_include_path,
+                          namespace='', header_include_path=None,
+                          builds_object=False):
+        """Writes the shared tables and subroutines followed by the render
+        function of every drawing.
+        """
+        colors, shared_runs, all_replacements = self.__analyze()
+
+        basename = os.path.splitext(os.path.basename(filename))[0]
+        header_include_path = os.path.join(header_include_path or '',
+                                           '%s.h' % basename)
+        output.write('#include "%s"\n\n' % header_include_path)
+        if nanovg_include_path:
+            output.write('#include "%s"\n\n' % nanovg_include_path)
+        if namespace:
+            output.write('namespace %s {\n\n' % namespace)
+
+        if colors:
+            output.write('%s\n\n' % oplist.format_color_table(colors))
+
+        shared_runs.write_functions(output)
+
+        parameters = get_parameters(self.context, self.culls)
+        for (drawing_filename, ops, width, height), replacements in \
+                zip(self.drawings, all_replacements):
+            title = get_title(drawing_filename)
+            if builds_object:
+                output.write('void %s::Draw(%s) const {\n' % (title,
+                                                             parameters))
+            else:
+                output.write('void Render%s(%s) {\n' % (title, parameters))
+            for stmt in oplist.iter_stmts(ops, self.context, colors,
+                                          replacements):
+                output.write('  %s\n' % stmt)
+            output.write('}\n\n')
+
+        if namespace:
+            output.write('}  // namespace %s\n' % namespace)
@@ -0,0 +1,236 @@
+// Copyright (c) 2014 Olli Wang. All right reserved.
+//
+//  Licensed under the Apache License, Version 2.0 (the "License");
+//  you may not use this file except in compliance with the License.
+//  You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+//  Unless required by applicable law or agreed to in writing, software
+//  distributed under the License is distributed on an "AS IS" BASIS,
+//  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+//  See the License for the specific language governing permissions and
+//  limitations under the License.
+
+#include "nvgb.h"
+
+#include <string.h>
+
+#ifndef NVGB_NO_MMAP
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+#define NVGB_HEADER_SIZE 32
+#define NVGB_MAX_CULL_DEPTH 256
+
+// Must match svg2nvg/oplist.py.
+enum NVGBopcode {
+  NVGB_BEGIN_PATH = 0,
+  NVGB_CLOSE_PATH,
+  NVGB_MOVE_TO,
+  NVGB_LINE_TO,
+  NVGB_BEZIER_TO,
+  NVGB_QUAD_TO,
+  NVGB_ARC_TO,
+  NVGB_CIRCLE,
+  NVGB_ELLIPSE,
+  NVGB_RECT,
+  NVGB_PATH_WINDING,
+  NVGB_FILL,
+  NVGB_STROKE,
+  NVGB_FILL_COLOR,
+  NVGB_STROKE_COLOR,
+  NVGB_FILL_LINEAR_GRADIENT,
+  NVGB_STROKE_WIDTH,
+  NVGB_LINE_CAP,
+  NVGB_LINE_JOIN,
+  NVGB_MITER_LIMIT,
+  NVGB_SAVE,
+  NVGB_RESTORE,
+  NVGB_TRANSFORM,
+  NVGB_CULL_BEGIN,
+  NVGB_CULL_END,
+  NVGB_OPCODE_COUNT
+};
+
+static const uint8_t kArities[NVGB_OPCODE_COUNT] = {
+  0, 0, 2, 2, 6, 4, 5, 3, 4, 4, 1, 0, 0, 4, 4, 12, 1, 1, 1, 1, 0, 0, 6, 6, 0,
+};
+
+static uint32_t nvgb__readU32(const uint8_t* p) {
+  return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) |
+         ((uint32_t)p[3] << 24);
+}
+
+static float nvgb__readF32(const uint8_t* p) {
+  uint32_t bits = nvgb__readU32(p);
+  float value;
+  memcpy(&value, &bits, sizeof(value));
+  return value;
+}
+
+static NVGcolor nvgb__color(const float* args) {
+  return nvgRGBA((unsigned char)args[0], (unsigned char)args[1],
+                 (unsigned char)args[2], (unsigned char)args[3]);
+}
+
+int nvgbLoad(NVGBdrawing* drawing, const void* data, size_t size) {
+  const uint8_t* bytes = (const uint8_t*)data;
+  uint32_t commandsOffset, argsOffset, required, i;
+  uint32_t cullCommands[NVGB_MAX_CULL_DEPTH], cullArgs[NVGB_MAX_CULL_DEPTH];
+  int depth = 0;
+
+  drawing->mapping = NULL;
+  drawing->mappingSize = 0;
+  if (size < NVGB_HEADER_SIZE || memcmp(bytes, "NVGB", 4) != 0)
+    return -1;
+  if ((bytes[4] | (bytes[5] << 8)) != NVGB_VERSION)
+    return -1;
+
+  drawing->width = nvgb__readF32(bytes + 8);
+  drawing->height = nvgb__readF32(bytes + 12);
+  drawing->commandCount = nvgb__readU32(bytes + 16);
+  drawing->argCount = nvgb__readU32(bytes + 20);
+  commandsOffset = nvgb__readU32(bytes + 24);
+  argsOffset = nvgb__readU32(bytes + 28);
+  if ((size_t)commandsOffset + drawing->commandCount > size ||
+      argsOffset % 4 != 0 ||
+      (size_t)argsOffset + (size_t)drawing->argCount * 4 > size ||
+      ((uintptr_t)bytes + argsOffset) % sizeof(float) != 0)
+    return -1;
+
+  drawing->commands = bytes + commandsOffset;
+  drawing->args = (const float*)(bytes + argsOffset);
+
+  // Makes sure every opcode is known, the operands add up and every culling
+  // region skips exactly to its end, so nvgbDraw() never reads past the
+  // payload.
+  required = 0;
+  for (i = 0; i < drawing->commandCount; ++i) {
+    uint8_t command = drawing->commands[i];
+    if (command >= NVGB_OPCODE_COUNT)
+      return -1;
+    if (command == NVGB_CULL_BEGIN) {
+      if (depth == NVGB_MAX_CULL_DEPTH ||
+          required + kArities[command] > drawing->argCount)
+        return -1;
+      cullCommands[depth] = i;
+      cullArgs[depth] = required;
+      ++depth;
+    } else if (command == NVGB_CULL_END) {
+      const float* a;
+      if (depth == 0)
+        return -1;
+      --depth;
+      a = drawing->args + cullArgs[depth];
+      if (a[4] != (float)(i - cullCommands[depth]) ||
+          a[5] != (float)(required - cullArgs[depth] -
+                          kArities[NVGB_CULL_BEGIN]))
+        return -1;
+    }
+    required += kArities[command];
+  }
+  return depth == 0 && required == drawing->argCount ? 0 : -1;
+}
+
+// Replays a drawing, `view` is either NULL or the x, y, width and height of
+// the view rectangle.
+static void nvgb__draw(NVGcontext* ctx, const NVGBdrawing* drawing,
+                       const float* view) {
+  const uint8_t* command = drawing->commands;
+  const uint8_t* end = command + drawing->commandCount;
+  const float* a = drawing->args;
+
+  for (; command < end; a += kArities[*command++]) {
+    switch (*command) {
+      case NVGB_BEGIN_PATH: nvgBeginPath(ctx); break;
+      case NVGB_CLOSE_PATH: nvgClosePath(ctx); break;
+      case NVGB_MOVE_TO: nvgMoveTo(ctx, a[0], a[1]); break;
+      case NVGB_LINE_TO: nvgLineTo(ctx, a[0], a[1]); break;
+      case NVGB_BEZIER_TO:
+        nvgBezierTo(ctx, a[0], a[1], a[2], a[3], a[4], a[5]);
+        break;
+      case NVGB_QUAD_TO: nvgQuadTo(ctx, a[0], a[1], a[2], a[3]); break;
+      case NVGB_ARC_TO: nvgArcTo(ctx, a[0], a[1], a[2], a[3], a[4]); break;
+      case NVGB_CIRCLE: nvgCircle(ctx, a[0], a[1], a[2]); break;
+      case NVGB_ELLIPSE: nvgEllipse(ctx, a[0], a[1], a[2], a[3]); break;
+      case NVGB_RECT: nvgRect(ctx, a[0], a[1], a[2], a[3]); break;
+      case NVGB_PATH_WINDING: nvgPathWinding(ctx, (int)a[0]); break;
+      case NVGB_FILL: nvgFill(ctx); break;
+      case NVGB_STROKE: nvgStroke(ctx); break;
+      case NVGB_FILL_COLOR: nvgFillColor(ctx, nvgb__color(a)); break;
+      case NVGB_STROKE_COLOR: nvgStrokeColor(ctx, nvgb__color(a)); break;
+      case NVGB_FILL_LINEAR_GRADIENT:
+        nvgFillPaint(ctx, nvgLinearGradient(ctx, a[0], a[1], a[2], a[3],
+                                            nvgb__color(a + 4),
+                                            nvgb__color(a + 8)));
+        break;
+      case NVGB_STROKE_WIDTH: nvgStrokeWidth(ctx, a[0]); break;
+      case NVGB_LINE_CAP: nvgLineCap(ctx, (int)a[0]); break;
+      case NVGB_LINE_JOIN: nvgLineJoin(ctx, (int)a[0]); break;
+      case NVGB_MITER_LIMIT: nvgMiterLimit(ctx, a[0]); break;
+      case NVGB_SAVE: nvgSave(ctx); break;
+      case NVGB_RESTORE: nvgRestore(ctx); break;
+      case NVGB_TRANSFORM:
+        nvgTransform(ctx, a[0], a[1], a[2], a[3], a[4], a[5]);
+        break;
+      case NVGB_CULL_BEGIN:
+        // Jumps to the matching NVGB_CULL_END, which takes no operands.
+        if (view != NULL &&
+            (a[2] < view[0] || a[3] < view[1] ||
+             view[0] + view[2] < a[0] || view[1] + view[3] < a[1])) {
+          command += (uint32_t)a[4];
+          a += kArities[NVGB_CULL_BEGIN] + (uint32_t)a[5];
+          continue;
+        }
+        break;
+      case NVGB_CULL_END: break;
+    }
+  }
+}
+
+void nvgbDraw(NVGcontext* ctx, const NVGBdrawing* drawing) {
+  nvgb__draw(ctx, drawing, NULL);
+}
+
+void nvgbDrawViewport(NVGcontext* ctx, const NVGBdrawing* drawing, float x,
+                      float y, float width, float height) {
+  const float view[4] = {x, y, width, height};
+  nvgb__draw(ctx, drawing, view);
+}
+
+#ifndef NVGB_NO_MMAP
+int nvgbOpenFile(NVGBdrawing* drawing, const char* path) {
+  struct stat info;
+  void* mapping;
+  int fd = open(path, O_RDONLY);
+  if (fd < 0)
+    return -1;
+  if (fstat(fd, &info) != 0 || info.st_size == 0) {
+    close(fd);
+    return -1;
+  }
+  mapping = mmap(NULL, (size_t)info.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+  close(fd);
+  if (mapping == MAP_FAILED)
+    return -1;
+
+  if (nvgbLoad(drawing, mapping, (size_t)info.st_size) != 0) {
+    munmap(mapping, (size_t)info.st_size);
+    return -1;
+  }
+  drawing->mapping = mapping;
+  drawing->mappingSize = (size_t)info.st_size;
+  return 0;
+}
+
+void nvgbCloseFile(NVGBdrawing* drawing) {
+  if (drawing->mapping != NULL)
+    munmap(drawing->mapping, drawing->mappingSize);
+  drawing->mapping = NULL;
+  drawing->mappingSize = 0;
+}
+#endif  // NVGB_NO_MMAP
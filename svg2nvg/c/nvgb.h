@@ -0,0 +1,75 @@
+// Copyright (c) 2014 Olli Wang. All right reserved.
+//
+//  Licensed under the Apache License, Version 2.0 (the "License");
+//  you may not use this file except in compliance with the License.
+//  You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+//  Unless required by applicable law or agreed to in writing, software
+//  distributed under the License is distributed on an "AS IS" BASIS,
+//  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+//  See the License for the specific language governing permissions and
+//  limitations under the License.
+
+// Reference loader and player for .nvgb files written by svg2nvg.
+//
+// The loader never copies or parses the drawing: nvgbLoad() validates the
+// header and the command stream of a buffer in place, and nvgbDraw() replays
+// the commands straight from that buffer. The buffer is typically a
+// read-only memory map, see nvgbOpenFile(). Operands are read in place, so
+// the player assumes a little-endian host.
+
+#ifndef SVG2NVG_NVGB_H_
+#define SVG2NVG_NVGB_H_
+
+#include <stddef.h>
+#include <stdint.h>
+
+#include "nanovg.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#define NVGB_VERSION 1
+
+typedef struct NVGBdrawing {
+  float width;
+  float height;
+  uint32_t commandCount;
+  uint32_t argCount;
+  const uint8_t* commands;
+  const float* args;
+  // Set by nvgbOpenFile() so nvgbCloseFile() can unmap the file.
+  void* mapping;
+  size_t mappingSize;
+} NVGBdrawing;
+
+// Points `drawing` into `data`, which must stay valid and 4-byte aligned for
+// as long as the drawing is used. Returns 0 on success or -1 if the data is
+// not a valid .nvgb file of a supported version.
+int nvgbLoad(NVGBdrawing* drawing, const void* data, size_t size);
+
+// Replays all commands of a loaded drawing.
+void nvgbDraw(NVGcontext* ctx, const NVGBdrawing* drawing);
+
+// Replays the commands of a loaded drawing, skipping culling regions whose
+// bounds lie outside the given view rectangle. The rectangle is in the
+// drawing's coordinate space.
+void nvgbDrawViewport(NVGcontext* ctx, const NVGBdrawing* drawing, float x,
+                      float y, float width, float height);
+
+#ifndef NVGB_NO_MMAP
+// Memory-maps and loads an .nvgb file. Returns 0 on success or -1 on error.
+int nvgbOpenFile(NVGBdrawing* drawing, const char* path);
+
+// Unmaps a drawing opened with nvgbOpenFile().
+void nvgbCloseFile(NVGBdrawing* drawing);
+#endif  // NVGB_NO_MMAP
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif  // SVG2NVG_NVGB_H_
@@ -0,0 +1,127 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A content-addressed cache of generated files.
+
+Entries are keyed by a hash of the SVG content, the options affecting the
+output and the svg2nvg version, so a hit is valid no matter where or when the
+file was converted. Each entry is a directory holding one file per output,
+named by the output's suffix. The modification time of an entry records its
+last use, and `Cache.trim()` evicts the least recently used entries once the
+cache exceeds its size bound.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import svg2nvg
+
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class Cache(object):
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def __get_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get_key(self, data, options):
+        """Returns the key of SVG content `data` converted with `options`, a
+        JSON serializable dict.
+        """
+        digest = hashlib.sha256()
+        digest.update(svg2nvg.__version__.encode('utf-8') + b'\0')
+        digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the outputs stored at `key` as a dict of contents keyed by
+        suffix, or `None` if there is no such entry.
+        """
+        path = self.__get_path(key)
+        try:
+            names = os.listdir(path)
+            outputs = dict()
+            for name in names:
+                with open(os.path.join(path, name), 'rb') as entry_file:
+                    outputs[name] = entry_file.read()
+            os.utime(path)
+        except OSError:
+            # Missing, or evicted by another process while being read.
+            return None
+        return outputs
+
+    def put(self, key, outputs):
+        """Stores a dict of output contents keyed by suffix at `key`."""
+        path = self.__get_path(key)
+        if os.path.isdir(path):
+            return
+        # Entries are completed under a temporary name, so concurrent
+        # readers never see a partial entry.
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        os.makedirs(temp_path, exist_ok=True)
+        for name, content in outputs.items():
+            with open(os.path.join(temp_path, name), 'wb') as entry_file:
+                entry_file.write(content)
+        try:
+            os.rename(temp_path, path)
+        except OSError:
+            # Another process stored the same entry first.
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return
+        # Trimming scans the whole cache, so it only runs for one in about
+        # 256 stored entries, picked by the uniformly distributed key.
+        if key.startswith('00'):
+            self.trim()
+
+    def trim(self):
+        """Evicts the least recently used entries until the cache fits its
+        size bound. Returns the number of evicted entries.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        entries = list()
+        total_size = 0
+        for prefix in os.listdir(self.directory):
+            prefix_path = os.path.join(self.directory, prefix)
+            if not os.path.isdir(prefix_path):
+                continue
+            for key in os.listdir(prefix_path):
+                if key.endswith('.tmp'):
+                    continue
+                path = os.path.join(prefix_path, key)
+                try:
+                    size = sum(os.path.getsize(os.path.join(path, name))
+                               for name in os.listdir(path))
+                    entries.append((os.path.getmtime(path), size, path))
+                except OSError:
+                    continue
+                total_size += size
+
+        count = 0
+        for mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            count += 1
+        return count
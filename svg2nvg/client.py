@@ -0,0 +1,61 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A thin client of the conversion server, see `svg2nvg.server`.
+
+The client takes the same arguments as `svg2nvg` and forwards them to the
+server listening at the socket named by the `SVG2NVG_SOCKET` environment
+variable. It only imports the standard library, and converts in its own
+process if no server is reachable.
+"""
+
+import json
+import os
+import socket
+import sys
+
+
+SOCKET_ENVIRONMENT_VARIABLE = 'SVG2NVG_SOCKET'
+
+
+def request(socket_path, argv, cwd=None):
+    """Sends a command line to the server and returns its response dict."""
+    message = dict(argv=argv, cwd=cwd or os.getcwd())
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as response_file:
+            line = response_file.readline()
+    finally:
+        connection.close()
+    if not line:
+        raise ConnectionError('the server closed the connection')
+    return json.loads(line)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    socket_path = os.environ.get(SOCKET_ENVIRONMENT_VARIABLE)
+    if socket_path:
+        try:
+            response = request(socket_path, argv)
+        except OSError:
+            response = None
+        if response is not None:
+            sys.stdout.write(response['stdout'])
+            sys.stderr.write(response['stderr'])
+            sys.exit(response['status'])
+
+    from svg2nvg import command
+    command.execute_from_command_line(argv)
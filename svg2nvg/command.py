@@ -12,16 +12,24 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+# Modules that import svgelements or are only needed by some options are
+# imported where they are used, so `--help`, argument errors and cache hits
+# start quickly. See benchmarks/startup.py.
+
 import argparse
+import contextlib
+import filecmp
+import glob
+import io
 import os
 import sys
-
-from svg2nvg.parser import SVGParser
+import time
 
 
 parser = argparse.ArgumentParser(
     description='Convert SVG files to NVG source code')
-parser.add_argument('svg_path', help='path to a SVG file')
+parser.add_argument('svg_paths', nargs='*', metavar='svg_path',
+                    help='path to a SVG file, a directory or a glob pattern')
 parser.add_argument('-o', '--build_object', action='store_true',
                     help='generate class source files')
 parser.add_argument('-c', '--context', default='context',
@@ -40,52 +48,535 @@ parser.add_argument('-ns', '--namespace', default='',
                     help='add C++ namespace to header file')
 parser.add_argument('-bc', '--baseclass', default='',
                     help='the C++ base class to inherit from')
+parser.add_argument('-k', '--bake_transforms', action='store_true',
+                    help='apply transforms to coordinates at conversion time '
+                         'instead of calling nvgTransform()')
+parser.add_argument('--cull', action='store_true',
+                    help='skip elements outside the view rectangle passed to '
+                         'the render function')
+parser.add_argument('--stream', action='store_true',
+                    help='read SVG files incrementally, so memory use '
+                         'depends on nesting depth rather than file size')
+parser.add_argument('--group_jobs', type=int, default=1, metavar='JOBS',
+                    help='walk the top-level elements of each SVG file in '
+                         'this many worker processes')
+parser.add_argument('-s', '--simplify', type=float, metavar='TOLERANCE',
+                    help='simplify paths within this distance in user units')
+parser.add_argument('-p', '--precision', type=int,
+                    help='the number of decimal places of coordinates')
+parser.add_argument('-g', '--grid', type=float,
+                    help='snap coordinates to multiples of this size, '
+                         'e.g. 0.5 for half device pixels')
+parser.add_argument('-u', '--subroutines', action='store_true',
+                    help='write repeated path geometry once as static '
+                         'functions called with its position')
+parser.add_argument('--min_subroutine_length', type=int, default=4,
+                    metavar='LENGTH',
+                    help='the minimum number of calls of path geometry '
+                         'shared by --subroutines or --bundle')
+parser.add_argument('--color_table', action='store_true',
+                    help='write colors once as a static const NVGcolor '
+                         'table instead of calling nvgRGBA()')
+parser.add_argument('-O', '--optimize', action='store_true',
+                    help='remove redundant NanoVG calls')
+parser.add_argument('-t', '--data_table', action='store_true',
+                    help='generate static data tables replayed by a loop '
+                         'instead of one statement per call')
+parser.add_argument('-b', '--binary_file', action='store_true',
+                    help='generate a .nvgb binary drawing file')
+parser.add_argument('--bundle', metavar='NAME',
+                    help='generate NAME.h and NAME.cc rendering all SVG '
+                         'files with shared colors and subroutines')
+parser.add_argument('-w', '--watch', action='store_true',
+                    help='keep running and regenerate the output of SVG '
+                         'files whose content changed')
+parser.add_argument('--interval', type=float, default=0.5,
+                    help='the number of seconds between checks for changes '
+                         'in watch mode')
+parser.add_argument('--serve', metavar='SOCKET',
+                    help='run a conversion server listening on this Unix '
+                         'domain socket, see svg2nvg-client')
+parser.add_argument('--cache_dir',
+                    help='reuse the files generated for identical SVG '
+                         'content and options from this directory')
+parser.add_argument('--cache_size', type=int, default=256, metavar='MB',
+                    help='the maximum size of the cache in megabytes, least '
+                         'recently used entries are evicted first')
+parser.add_argument('--depfile', action='store_true',
+                    help='write a Make and Ninja depfile next to the '
+                         'generated files')
+parser.add_argument('-m', '--manifest', action='append', default=[],
+                    help='a file listing one SVG path per line to convert')
+parser.add_argument('--stats', action='store_true',
+                    help='print phase timings and element and call counts')
+parser.add_argument('--stats_file',
+                    help='write phase timings and element and call counts '
+                         'of all converted files to this JSON file')
+parser.add_argument('-j', '--jobs', type=int, default=0,
+                    help='the number of worker processes for batch '
+                         'conversion or the server, defaults to the number '
+                         'of CPUs')
 
-def execute_from_command_line():
-    if len(sys.argv) == 1:
-        parser.print_help()
+
+def collect_svg_paths(paths, manifests=()):
+    """Expands directories, glob patterns and manifest files.
+
+    Directories are searched recursively for `.svg` files. Lines in a manifest
+    file that are empty or start with `#` are ignored, relative paths are
+    resolved against the manifest's directory. Duplicates are dropped while
+    keeping the first occurrence's order.
+    """
+    candidates = list()
+    for manifest in manifests:
+        manifest_dir = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as manifest_file:
+            for line in manifest_file:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                candidates.append(os.path.join(manifest_dir, line))
+    candidates.extend(paths)
+
+    svg_paths = list()
+    for candidate in candidates:
+        if os.path.isdir(candidate):
+            matches = list()
+            for dirpath, dirnames, filenames in os.walk(candidate):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith('.svg'):
+                        matches.append(os.path.join(dirpath, filename))
+        elif glob.has_magic(candidate):
+            matches = sorted(glob.glob(candidate, recursive=True))
+        else:
+            matches = [candidate]
+        svg_paths.extend(matches)
+
+    seen = set()
+    result = list()
+    for svg_path in svg_paths:
+        key = os.path.abspath(svg_path)
+        if key not in seen:
+            seen.add(key)
+            result.append(svg_path)
+    return result
+
+# The options that don't affect the content of generated files.
+NON_OUTPUT_OPTIONS = ('cache_dir', 'cache_size', 'depfile', 'dest',
+                      'group_jobs', 'interval', 'jobs', 'manifest', 'serve',
+                      'stats', 'stats_file', 'stream', 'svg_paths', 'watch')
+
+
+@contextlib.contextmanager
+def open_output(path, mode='w'):
+    """Opens a file for writing that replaces `path` atomically once the
+    block completes, so readers never see a partially written file.
+
+    If `path` already has the written content, it is left untouched so its
+    modification time doesn't trigger rebuilds.
+    """
+    dirname, basename = os.path.split(os.path.abspath(path))
+    # The process id keeps concurrent writers of the same path apart.
+    temp_path = os.path.join(dirname, '.%s.%d.tmp' % (basename, os.getpid()))
+    try:
+        with open(temp_path, mode) as output:
+            yield output
+        if os.path.isfile(path) and filecmp.cmp(temp_path, path,
+                                                shallow=False):
+            os.unlink(temp_path)
+        else:
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+def escape_depfile_path(path):
+    return path.replace(' ', '\\ ').replace('$', '$$')
+
+def write_depfile(path, output_paths, input_paths):
+    """Writes a Make and Ninja compatible depfile declaring that the files
+    `output_paths` depend on `input_paths`.
+    """
+    with open_output(path) as depfile:
+        depfile.write('%s: %s\n' % (
+            ' '.join(escape_depfile_path(p) for p in output_paths),
+            ' '.join(escape_depfile_path(p) for p in input_paths)))
+        # Keeps make from failing once an input is deleted.
+        for input_path in input_paths:
+            depfile.write('\n%s:\n' % escape_depfile_path(input_path))
+
+def get_output_extensions(args):
+    """Returns the extensions of the files generated for each SVG file."""
+    extensions = list()
+    if args.binary_file:
+        extensions.append('nvgb')
+    if args.source_file:
+        extensions.extend(('h', 'cc'))
+    elif args.header_file:
+        extensions.append('h')
+    return extensions
+
+def get_cache_options(basename, args):
+    """Returns the options that affect the generated content of an SVG file
+    named `basename`.
+    """
+    options = dict((name, value) for name, value in vars(args).items()
+                   if name not in NON_OUTPUT_OPTIONS)
+    options['basename'] = basename
+    return options
+
+def check_output_names(svg_paths, args):
+    """Prints an error and returns `True` if two SVG files would write to the
+    same output files or define the same render function.
+    """
+    if not (args.source_file or args.header_file or args.binary_file or
+            args.bundle):
+        return False
+    basenames = dict()
+    for svg_path in svg_paths:
+        basename = os.path.splitext(os.path.basename(svg_path))[0]
+        if basename in basenames:
+            print(' !! Conflicting output names: %s and %s' %
+                  (basenames[basename], svg_path), file=sys.stderr)
+            return True
+        basenames[basename] = svg_path
+    return False
+
+def parse(svg_path, args, collects_stats=False, source=None, messages=None):
+    """Parses and post-processes a single SVG file according to the command
+    line arguments. Returns the `SVGParser`.
+
+    `source` is a file object to read instead of `svg_path`. The reports of
+    the post-processing passes are printed and, if `messages` is a list,
+    appended to it.
+    """
+    def report(message):
+        print(message, file=sys.stderr)
+        if messages is not None:
+            messages.append(message)
+
+    from svg2nvg.parser import SVGParser
+    svg_parser = SVGParser(args.context, args.bake_transforms, args.cull,
+                           collects_stats=collects_stats or args.stats)
+    if args.stream:
+        svg_parser.parse_stream(svg_path if source is None else source)
+    else:
+        svg_parser.parse(svg_path if source is None else source,
+                         args.group_jobs)
+    if args.simplify:
+        count = svg_parser.simplify(args.simplify)
+        report('Removed %d path calls from %s by simplification' %
+               (count, svg_path))
+    if args.precision is not None or args.grid:
+        error = svg_parser.quantize(args.precision, args.grid)
+        report('Quantized coordinates of %s with a maximum error of %g' %
+               (svg_path, error))
+    if args.optimize:
+        count = svg_parser.optimize()
+        report('Removed %d redundant calls from %s' % (count, svg_path))
+    return svg_parser
+
+def report_stats(svg_parser, svg_path, args, stats=None):
+    """Prints the statistics of a conversion if `--stats` is specified and
+    updates the dict `stats` with them.
+    """
+    if svg_parser.stats is None:
         return
+    report = svg_parser.get_stats()
+    if args.stats:
+        print('Stats of %s:\n%s' % (svg_path, report.format()),
+              file=sys.stderr)
+    if stats is not None:
+        stats.update(report.to_dict())
+
+def report_cached(svg_path, args, outputs, stats=None):
+    """Repeats the post-processing reports stored with a cache entry and
+    reports the file as cached instead of its statistics, as it wasn't
+    converted.
+    """
+    messages = outputs.get('messages')
+    if messages:
+        print(messages.decode('utf-8'), file=sys.stderr)
+    if args.stats:
+        print('Stats of %s: none, reused the output of an earlier conversion '
+              'from the cache' % svg_path, file=sys.stderr)
+    if stats is not None:
+        stats['cached'] = True
+
+def write_cached_content(data, output=None):
+    """Writes content without surrounding code like `write_content()` of
+    `SVGParser` if `output` is a file object, or returns it otherwise.
+    """
+    if data is None:
+        return None
+    content = data.decode('utf-8')
+    if output is None:
+        return content
+    if content:
+        output.write(content)
+        output.write('\n')
+    return None
 
-    args = parser.parse_args()
-    svg_parser = SVGParser(args.context)
-    svg_parser.parse(args.svg_path)
+def convert(svg_path, args, stats=None, output=None, source=None):
+    """Converts a single SVG file according to the command line arguments.
 
-    basename = os.path.splitext(os.path.basename(args.svg_path))[0]
+    Generated files are written to `args.dest`. If none of `--source_file`,
+    `--header_file` and `--binary_file` is specified, the generated content is
+    written to the file object `output`, or returned if `output` is `None`.
+    Returns `None` otherwise. If `stats` is a dict, it is updated with the
+    statistics of the conversion, or with `cached=True` if the output was
+    reused from the cache. `source` is passed to `parse()`.
+    """
+    basename = os.path.splitext(os.path.basename(svg_path))[0]
     dest_path = os.path.join(os.path.abspath(args.dest), basename)
+    extensions = get_output_extensions(args)
+    if args.depfile and extensions:
+        write_depfile('%s.d' % dest_path,
+                      [os.path.join(args.dest, '%s.%s' % (basename, extension))
+                       for extension in extensions], [svg_path])
+
+    cache = None
+    if args.cache_dir:
+        if source is None:
+            with open(svg_path, 'rb') as source_file:
+                data = source_file.read()
+        else:
+            data = source.read()
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+        from svg2nvg.cache import Cache
+        cache = Cache(args.cache_dir, args.cache_size * 1024 * 1024)
+        key = cache.get_key(data, get_cache_options(basename, args))
+        outputs = cache.get(key)
+        if outputs is not None:
+            for extension in extensions:
+                with open_output('%s.%s' % (dest_path, extension),
+                                 'wb') as output_file:
+                    output_file.write(outputs[extension])
+            report_cached(svg_path, args, outputs, stats)
+            return write_cached_content(outputs.get('stdout'), output)
+        source = io.BytesIO(data)
+
+    messages = list()
+    svg_parser = parse(svg_path, args, stats is not None, source, messages)
+    content = None
+    min_length = args.min_subroutine_length if args.subroutines else None
+
+    if args.binary_file and args.dest is not None:
+        with open_output('%s.nvgb' % dest_path, 'wb') as binary_file:
+            binary_file.write(svg_parser.get_binary_content())
 
-    namespaces = list()
     if args.source_file:
-        result = svg_parser.get_header_file_content(basename,
-                                                    args.nanovg_include_path,
-                                                    args.namespace,
-                                                    args.baseclass,
-                                                    args.build_object,
-                                                    prototype_only=True)
-        if args.dest is not None:
-            header_file = open('%s.h' % dest_path, 'w')
-            header_file.write(result)
-            header_file.close()
-
-        result = svg_parser.get_source_file_content(basename,
-                                                    args.nanovg_include_path,
-                                                    args.namespace,
-                                                    args.include_path,
-                                                    args.build_object)
         if args.dest is not None:
-            source_file = open('%s.cc' % dest_path, 'w')
-            source_file.write(result)
-            source_file.close()
+            with open_output('%s.h' % dest_path) as header_file:
+                svg_parser.write_header_file(header_file, basename,
+                                             args.nanovg_include_path,
+                                             args.namespace, args.baseclass,
+                                             args.build_object,
+                                             prototype_only=True,
+                                             data_table=args.data_table)
+            with open_output('%s.cc' % dest_path) as source_file:
+                svg_parser.write_source_file(source_file, basename,
+                                             args.nanovg_include_path,
+                                             args.namespace,
+                                             args.include_path,
+                                             args.build_object,
+                                             args.data_table, min_length,
+                                             args.color_table)
     elif args.header_file:
-        result = svg_parser.get_header_file_content(args.svg_path,
-                                                    args.nanovg_include_path,
-                                                    args.namespace,
-                                                    args.baseclass,
-                                                    args.build_object,
-                                                    prototype_only=False)
         if args.dest is not None:
-            header_file = open('%s.h' % dest_path, 'w')
-            header_file.write(result)
-            header_file.close()
+            with open_output('%s.h' % dest_path) as header_file:
+                svg_parser.write_header_file(header_file, svg_path,
+                                             args.nanovg_include_path,
+                                             args.namespace, args.baseclass,
+                                             args.build_object,
+                                             prototype_only=False,
+                                             data_table=args.data_table,
+                                             min_subroutine_length=min_length,
+                                             color_table=args.color_table)
+    elif not args.binary_file:
+        if output is not None and cache is None:
+            svg_parser.write_content(output, args.data_table)
+        else:
+            content = svg_parser.get_content(args.data_table)
+
+    if cache is not None:
+        outputs = dict()
+        for extension in extensions:
+            with open('%s.%s' % (dest_path, extension), 'rb') as output_file:
+                outputs[extension] = output_file.read()
+        if content is not None:
+            outputs['stdout'] = content.encode('utf-8')
+        if messages:
+            outputs['messages'] = '\n'.join(messages).encode('utf-8')
+        cache.put(key, outputs)
+        content = write_cached_content(outputs.get('stdout'), output)
+
+    report_stats(svg_parser, svg_path, args, stats)
+    return content
+
+def _convert_in_worker(svg_path, args):
+    """Wraps `convert()` so that a failure doesn't abort the whole batch."""
+    start_time = time.perf_counter()
+    stats = dict() if args.stats_file else None
+    try:
+        result = convert(svg_path, args, stats)
+    except Exception as error:
+        return svg_path, None, '%s: %s' % (error.__class__.__name__, error), \
+               time.perf_counter() - start_time, None
+    return svg_path, result, None, time.perf_counter() - start_time, stats
+
+def _parse_in_worker(svg_path, args):
+    """Wraps `parse()` for bundles, returning the recorded calls of a drawing
+    instead of generated code.
+    """
+    start_time = time.perf_counter()
+    stats = dict() if args.stats_file else None
+    try:
+        svg_parser = parse(svg_path, args, stats is not None)
+        report_stats(svg_parser, svg_path, args, stats)
+    except Exception as error:
+        return svg_path, None, '%s: %s' % (error.__class__.__name__, error), \
+               time.perf_counter() - start_time, None
+    result = (svg_parser.ops, svg_parser.canvas_width,
+              svg_parser.canvas_height)
+    return svg_path, result, None, time.perf_counter() - start_time, stats
+
+def write_stats_file(path, stats_by_path):
+    """Writes the statistics of converted files as JSON, keyed by path."""
+    import json
+    with open(path, 'w') as stats_file:
+        json.dump(dict(files=stats_by_path), stats_file, indent=2,
+                  sort_keys=True)
+        stats_file.write('\n')
+
+def execute_batch(svg_paths, args):
+    """Converts multiple SVG files across a pool of worker processes.
+
+    If `--bundle` is specified, all drawings are written to a single header
+    and source file instead. Returns the number of files that failed to
+    convert.
+    """
+    if check_output_names(svg_paths, args):
+        return len(svg_paths)
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    jobs = min(jobs, len(svg_paths))
+    chunksize = max(1, len(svg_paths) // (jobs * 4))
+
+    start_time = time.perf_counter()
+    failures = list()
+    stats_by_path = dict()
+    busy_time = 0
+    bundle = None
+    if args.bundle:
+        from svg2nvg.bundle import Bundle
+        bundle = Bundle(args.context, args.cull, args.min_subroutine_length)
+    worker = _parse_in_worker if bundle is not None else _convert_in_worker
+    # A single job runs in this process, which also keeps pools from being
+    # nested in server workers.
+    if jobs > 1:
+        import concurrent.futures
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
     else:
-        result = svg_parser.get_content()
-        print(result)
+        executor = contextlib.nullcontext()
+    with executor:
+        if jobs > 1:
+            results = executor.map(worker, svg_paths,
+                                   [args] * len(svg_paths),
+                                   chunksize=chunksize)
+        else:
+            results = map(worker, svg_paths, [args] * len(svg_paths))
+        for svg_path, result, error, elapsed_time, stats in results:
+            busy_time += elapsed_time
+            if stats is not None:
+                stats_by_path[svg_path] = stats
+            if error is not None:
+                failures.append(svg_path)
+                print(' !! Failed to convert %s: %s' % (svg_path, error),
+                      file=sys.stderr)
+            elif bundle is not None:
+                bundle.add(svg_path, *result)
+            elif result is not None:
+                print(result)
+
+    # A bundle missing some drawings would break its callers, so nothing is
+    # written unless every file converted.
+    if bundle is not None and not failures:
+        write_bundle(bundle, args)
+
+    print('Converted %d of %d files with %d jobs in %.2fs '
+          '(%.2fs of conversion time)' %
+          (len(svg_paths) - len(failures), len(svg_paths), jobs,
+           time.perf_counter() - start_time, busy_time), file=sys.stderr)
+    if args.stats_file:
+        write_stats_file(args.stats_file, stats_by_path)
+    if args.cache_dir:
+        from svg2nvg.cache import Cache
+        Cache(args.cache_dir, args.cache_size * 1024 * 1024).trim()
+    return len(failures)
+
+def write_bundle(bundle, args):
+    """Writes the header and source file of a bundle to `args.dest`."""
+    header_path = os.path.join(args.dest, '%s.h' % args.bundle)
+    with open_output(header_path) as header_file:
+        bundle.write_header_file(header_file, header_path,
+                                 args.nanovg_include_path, args.namespace,
+                                 args.baseclass, args.build_object)
+    source_path = os.path.join(args.dest, '%s.cc' % args.bundle)
+    with open_output(source_path) as source_file:
+        bundle.write_source_file(source_file, source_path,
+                                 args.nanovg_include_path, args.namespace,
+                                 args.include_path, args.build_object)
+    if args.depfile:
+        write_depfile(os.path.join(args.dest, '%s.d' % args.bundle),
+                      [header_path, source_path],
+                      [filename for filename, ops, width, height
+                       in bundle.drawings])
+
+def execute(args):
+    """Runs the command described by parsed command line arguments."""
+    if args.bundle and (args.data_table or args.binary_file or
+                        args.source_file or args.header_file):
+        parser.error('--bundle cannot be combined with --data_table, '
+                     '--binary_file, --source_file or --header_file')
+    if (args.subroutines or args.color_table) and (args.data_table or not (
+            args.source_file or args.header_file or args.bundle)):
+        parser.error('--subroutines and --color_table require --source_file, '
+                     '--header_file or --bundle and cannot be combined with '
+                     '--data_table')
+    if args.stream and args.group_jobs > 1:
+        parser.error('--stream cannot be combined with --group_jobs')
+    # The watcher and server are imported here as they build on this module.
+    if args.watch:
+        from svg2nvg.watch import Watcher
+        Watcher(args).run(args.interval)
+        return
+    if args.serve:
+        from svg2nvg.server import serve
+        serve(args.serve, args.jobs)
+        return
+
+    is_batch = args.bundle or args.manifest or len(args.svg_paths) != 1 or \
+               os.path.isdir(args.svg_paths[0]) or \
+               glob.has_magic(args.svg_paths[0])
+    if not is_batch:
+        stats = dict() if args.stats_file else None
+        convert(args.svg_paths[0], args, stats, sys.stdout)
+        if stats is not None:
+            write_stats_file(args.stats_file, {args.svg_paths[0]: stats})
+        return
+
+    svg_paths = collect_svg_paths(args.svg_paths, args.manifest)
+    if not svg_paths:
+        parser.error('no SVG files found')
+    if execute_batch(svg_paths, args):
+        sys.exit(1)
+
+def execute_from_command_line(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        parser.print_help()
+        return
+    execute(parser.parse_args(argv))
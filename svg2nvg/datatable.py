@@ -0,0 +1,97 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Renders an `OpList` as static data tables plus a dispatch loop.
+
+Instead of one C statement per call, the function body holds a
+`static const uint8_t` opcode array, a `static const float` operand array and
+a small `switch` loop that replays them. The emitted code stays the same size
+no matter how many calls the drawing has, which keeps compile times and
+binary size down for complex illustrations.
+"""
+
+from svg2nvg import oplist
+
+
+VALUES_PER_LINE = 8
+
+
+def format_float(value):
+    return '%rf' % float(value)
+
+def format_color_operands(offset):
+    return 'nvgRGBA(%s)' % ', '.join(
+        '(unsigned char)args[%d]' % (offset + i) for i in range(4))
+
+def format_case(code, context):
+    """Returns the statements that replay an opcode from `args`."""
+    name, kinds = oplist.OPCODES[code]
+    if code == oplist.CULL_BEGIN:
+        return ['if (args[2] < view_x || args[3] < view_y || '
+                'view_x + view_width < args[0] || '
+                'view_y + view_height < args[1]) {',
+                '  i += (size_t)args[4];',
+                '  args += (size_t)args[5];',
+                '}',
+                'args += %d;' % len(kinds),
+                'break;']
+    elif code == oplist.CULL_END:
+        return ['break;']
+    elif code == oplist.FILL_COLOR or code == oplist.STROKE_COLOR:
+        operands = [format_color_operands(0)]
+    elif code == oplist.FILL_LINEAR_GRADIENT:
+        operands = ['nvgLinearGradient(%s, %s, %s, %s)' % (
+            context, ', '.join('args[%d]' % i for i in range(4)),
+            format_color_operands(4), format_color_operands(8))]
+    elif code in oplist.ENUM_NAMES:
+        operands = ['(int)args[0]']
+    else:
+        operands = ['args[%d]' % i for i in range(len(kinds))]
+
+    stmts = ['nvg%s(%s);' % (name, ', '.join([context] + operands))]
+    if kinds:
+        stmts.append('args += %d;' % len(kinds))
+    stmts.append('break;')
+    return stmts
+
+def iter_table_lines(values, formatter):
+    values = list(values)
+    for i in range(0, len(values), VALUES_PER_LINE):
+        chunk = values[i:i + VALUES_PER_LINE]
+        yield '  %s,' % ', '.join(formatter(value) for value in chunk)
+
+def iter_stmts(ops, context='context'):
+    """Lazily renders the body of a render function as lines of C code."""
+    if not len(ops):
+        return
+
+    oplist.resolve_cull_regions(ops)
+    yield 'static const uint8_t kCommands[] = {'
+    for line in iter_table_lines(ops.codes, str):
+        yield line
+    yield '};'
+    if len(ops.args):
+        yield 'static const float kArgs[] = {'
+        for line in iter_table_lines(ops.args, format_float):
+            yield line
+        yield '};'
+        yield 'const float *args = kArgs;'
+    yield 'for (size_t i = 0; i < sizeof(kCommands); ++i) {'
+    yield '  switch (kCommands[i]) {'
+    for code in sorted(set(ops.codes)):
+        yield '    case %d:' % code
+        for stmt in format_case(code, context):
+            yield '      %s' % stmt
+    yield '  }'
+    yield '}'
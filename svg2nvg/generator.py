@@ -12,146 +12,142 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import re
 import sys
 
 from svgelements import svgelements
+from svg2nvg import oplist
 
 class Generator(object):
 
-    def __init__(self, stmts, context='context'):
+    def __init__(self, ops, context='context'):
         self.context = context
-        self.stmts = stmts
+        self.ops = ops
         self.new_paint = True
 
         self.transform_counts = []
+        # Color operands keyed by `svgelements.Color.value`.
+        self.colors = dict()
 
-    def __append_stmt(self, *args):
-        stmt = self.__gen_stmt(*args)
-        self.stmts.append(stmt)
-
-    def __append_stmts(self, stmts):
-        for stmt in stmts:
-            self.__append_stmt(*stmt)
-
-    def __gen_stmt(self, *args):
-        command = args[0]
-        if len(args) == 1:
-            stmt = 'nvg%s(%s);' % (command, self.context)
-        else:
-            args = tuple(str(arg) for arg in args[1:])
-            stmt = 'nvg%s(%s, %s);' % (command, self.context, ', '.join(args))
-        return stmt
+    def __append_stmt(self, code, *args):
+        self.ops.append(code, *args)
 
     def arc_to(self, x1, y1, x2, y2, radius):
-        self.__append_stmt('ArcTo', x1, y1, x2, y2, radius)
+        self.__append_stmt(oplist.ARC_TO, x1, y1, x2, y2, radius)
 
     def begin_path(self):
-        self.__append_stmt('BeginPath')
+        self.__append_stmt(oplist.BEGIN_PATH)
 
     def bezier_to(self, c1x, c1y, c2x, c2y, x, y):
-        self.__append_stmt('BezierTo', c1x, c1y, c2x, c2y, x, y)
+        self.__append_stmt(oplist.BEZIER_TO, c1x, c1y, c2x, c2y, x, y)
 
     def circle(self, cx, cy, r):
-        self.__append_stmt('Circle', cx, cy, r)
+        self.__append_stmt(oplist.CIRCLE, cx, cy, r)
 
     def close_path(self):
-        self.__append_stmt('ClosePath')
+        self.__append_stmt(oplist.CLOSE_PATH)
+
+    def cull_begin(self):
+        """Opens a culling region, its operands are filled in by the caller
+        once the bounds are known.
+        """
+        self.__append_stmt(oplist.CULL_BEGIN, 0, 0, 0, 0, 0, 0)
+
+    def cull_end(self):
+        self.__append_stmt(oplist.CULL_END)
 
     def ellipse(self, cx, cy, rx, ry):
-        self.__append_stmt('Ellipse', cx, cy, rx, ry)
+        self.__append_stmt(oplist.ELLIPSE, cx, cy, rx, ry)
 
     def fill(self):
-        self.__append_stmt('Fill')
-
-    def fill_color(self, red, green, blue, alpha):
-        self.__append_stmt('FillColor', self.get_color(red, green, blue, alpha))
+        self.__append_stmt(oplist.FILL)
 
     def fill_color(self, color):
-        color = self.get_color_by_object(color)
-        self.__append_stmt('FillColor', color)
+        self.__append_stmt(oplist.FILL_COLOR, *self.get_color_by_object(color))
 
     def get_color(self, red, green, blue, alpha):
-        return 'nvgRGBA({}, {}, {}, {})'.format(red, green, blue, alpha)
+        return (red, green, blue, alpha)
 
     def get_color_by_object(self, color):
-        if color is None or not isinstance(color, svgelements.Color) or \
-           not color.opacity:
+        if color is None or not isinstance(color, svgelements.Color):
             return self.get_color(0, 0, 0, 0)
-        return 'nvgRGBA({}, {}, {}, {})'.format(color.red, color.green,
-                                                color.blue, color.alpha)
+        try:
+            return self.colors[color.value]
+        except KeyError:
+            pass
+        if color.opacity:
+            operands = (color.red, color.green, color.blue, color.alpha)
+        else:
+            operands = self.get_color(0, 0, 0, 0)
+        self.colors[color.value] = operands
+        return operands
 
     def line_cap(self, value):
         if value == 'butt':
-            join = 'NVG_BUTT'
+            cap = oplist.NVG_BUTT
         elif (value == 'round'):
-            join = 'NVG_ROUND'
+            cap = oplist.NVG_ROUND
         elif (value == 'square'):
-            join = 'NVG_SQUARE'
+            cap = oplist.NVG_SQUARE
         else:
             print(' !! Not supported value for nvgLineCap():', value)
+            return
 
-        self.__append_stmt('LineCap', join)
+        self.__append_stmt(oplist.LINE_CAP, cap)
 
     def line_to(self, x, y):
-        self.__append_stmt('LineTo', x, y)
+        self.__append_stmt(oplist.LINE_TO, x, y)
 
     def line_join(self, value):
         if value == 'bevel':
-            join = 'NVG_BEVEL'
+            join = oplist.NVG_BEVEL
         elif (value == 'miter'):
-            join = 'NVG_MITER'
+            join = oplist.NVG_MITER
         elif (value == 'round'):
-            join = 'NVG_ROUND'
+            join = oplist.NVG_ROUND
         else:
             print(' !! Not supported value for nvgLineJoin():', value)
+            return
 
-        self.__append_stmt('LineJoin', join)
+        self.__append_stmt(oplist.LINE_JOIN, join)
 
     def linear_gradient(self, sx, sy, ex, ey, scolor, ecolor):
-        paint = 'NVGpaint paint = {}'.format(
-            self.__gen_stmt('LinearGradient', sx, sy, ex, ey, scolor, ecolor))
-        self.stmts.append(paint)
-        self.__append_stmt('FillPaint', 'paint')
+        self.__append_stmt(oplist.FILL_LINEAR_GRADIENT, sx, sy, ex, ey,
+                           *(scolor + ecolor))
         self.fill()
 
     def miter_limit(self, limit):
-        self.__append_stmt('MiterLimit', limit)
+        self.__append_stmt(oplist.MITER_LIMIT, float(limit))
 
     def move_to(self, x, y):
-        self.__append_stmt('MoveTo', x, y)
+        self.__append_stmt(oplist.MOVE_TO, x, y)
 
     def path_winding_hole(self):
-        self.__append_stmt('PathWinding', 'NVG_HOLE')
+        self.__append_stmt(oplist.PATH_WINDING, oplist.NVG_HOLE)
 
     def path_winding_solid(self):
-        self.__append_stmt('PathWinding', 'NVG_SOLID')
+        self.__append_stmt(oplist.PATH_WINDING, oplist.NVG_SOLID)
 
     def quad_to(self, cx, cy, x, y):
-        self.__append_stmt('QuadTo', cx, cy, x, y)
+        self.__append_stmt(oplist.QUAD_TO, cx, cy, x, y)
 
     def rect(self, x, y, width, height):
-        self.__append_stmt('Rect', x, y, width, height)
+        self.__append_stmt(oplist.RECT, x, y, width, height)
 
     def restore(self):
-        self.__append_stmt('Restore')
+        self.__append_stmt(oplist.RESTORE)
 
     def save(self):
-        self.__append_stmt('Save')
+        self.__append_stmt(oplist.SAVE)
 
     def stroke(self):
-        self.__append_stmt('Stroke')
-
-    def stroke_color(self, red, green, blue, alpha):
-        self.__append_stmt('StrokeColor',
-                           self.get_color(red, green, blue, alpha))
+        self.__append_stmt(oplist.STROKE)
 
     def stroke_color(self, color):
         color = self.get_color_by_object(color)
-        self.__append_stmt('StrokeColor', color)
+        self.__append_stmt(oplist.STROKE_COLOR, *color)
 
     def stroke_width(self, width):
-        self.__append_stmt('StrokeWidth', width)
+        self.__append_stmt(oplist.STROKE_WIDTH, width)
 
     def transform(self, a, b, c, d, e, f):
-        self.__append_stmt('Transform', a, b, c, d, e, f)
+        self.__append_stmt(oplist.TRANSFORM, a, b, c, d, e, f)
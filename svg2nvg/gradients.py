@@ -0,0 +1,203 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Linear gradient definitions.
+
+svgelements keeps `<linearGradient>` elements inside `<defs>` out of the
+rendered tree and drops their `<stop>` children, so gradients are read from
+the document source with `read_linear_gradients()` instead. NanoVG linear
+gradients only have two colors, so the first and last stops are used.
+"""
+
+import re
+import xml.etree.ElementTree
+
+import svgelements
+
+
+URL_PATTERN = re.compile(r'url\(#([^)]*)\)')
+
+# The attributes a gradient inherits from the gradient its `href` refers to.
+INHERITED_ATTRIBUTES = ('x1', 'y1', 'x2', 'y2', 'gradientUnits',
+                        'gradientTransform')
+
+
+def get_local_name(name):
+    return name.rsplit('}', 1)[-1]
+
+def parse_coordinate(value, default, size=1):
+    """Parses a number, or a percentage of `size`, into a float."""
+    if value is None:
+        return default
+    value = value.strip()
+    if value.endswith('%'):
+        return float(value[:-1]) / 100 * size
+    return float(value)
+
+def parse_style(element_attributes):
+    """Returns the attributes with the declarations of `style` merged in."""
+    attributes = dict(element_attributes)
+    for declaration in attributes.pop('style', '').split(';'):
+        if ':' in declaration:
+            name, value = declaration.split(':', 1)
+            attributes[name.strip()] = value.strip()
+    return attributes
+
+
+class LinearGradient(object):
+
+    def __init__(self, id, attributes=None):
+        self.id = id
+        self.attributes = dict(attributes or ())
+        self.href = None
+        for name, value in self.attributes.items():
+            if get_local_name(name) == 'href' and value.startswith('#'):
+                self.href = value[1:]
+        # (offset, svgelements.Color) pairs in document order.
+        self.stops = list()
+
+    def add_stop(self, attributes):
+        attributes = parse_style(attributes)
+        offset = min(max(parse_coordinate(attributes.get('offset'), 0), 0), 1)
+        color = svgelements.Color(attributes.get('stop-color', 'black'))
+        if 'stop-opacity' in attributes:
+            color.opacity = color.opacity * \
+                            parse_coordinate(attributes['stop-opacity'], 1)
+        self.stops.append((offset, color))
+
+    def get_paint(self, bbox, width, height, matrix=None):
+        """Returns the start and end points and colors as a
+        `(sx, sy, ex, ey, start_color, end_color)` tuple.
+
+        `bbox` is the untransformed bounding box of the filled element and
+        `width` and `height` the size of the canvas. `matrix` is the
+        transform of the element if it is baked into its coordinates, which
+        is applied to the points as well. Returns a single color if both
+        colors are the same, or `None` if there are no stops.
+        """
+        if not self.stops:
+            return None
+        stops = sorted(self.stops, key=lambda stop: stop[0])
+        first_offset, first_color = stops[0]
+        last_offset, last_color = stops[-1]
+        if first_color == last_color:
+            return first_color
+
+        attributes = self.attributes
+        if attributes.get('gradientUnits') == 'userSpaceOnUse':
+            x1 = parse_coordinate(attributes.get('x1'), 0, width)
+            y1 = parse_coordinate(attributes.get('y1'), 0, height)
+            x2 = parse_coordinate(attributes.get('x2'), width, width)
+            y2 = parse_coordinate(attributes.get('y2'), 0, height)
+        elif bbox is None:
+            return first_color
+        else:
+            min_x, min_y, max_x, max_y = bbox
+            x1 = min_x + parse_coordinate(attributes.get('x1'), 0) * \
+                 (max_x - min_x)
+            y1 = min_y + parse_coordinate(attributes.get('y1'), 0) * \
+                 (max_y - min_y)
+            x2 = min_x + parse_coordinate(attributes.get('x2'), 1) * \
+                 (max_x - min_x)
+            y2 = min_y + parse_coordinate(attributes.get('y2'), 0) * \
+                 (max_y - min_y)
+
+        if attributes.get('gradientTransform'):
+            transform = svgelements.Matrix(attributes['gradientTransform'])
+            x1, y1 = transform.point_in_matrix_space((x1, y1))
+            x2, y2 = transform.point_in_matrix_space((x2, y2))
+        if matrix is not None:
+            x1, y1, x2, y2 = transform_vector(matrix, x1, y1, x2, y2)
+
+        sx = x1 + (x2 - x1) * first_offset
+        sy = y1 + (y2 - y1) * first_offset
+        ex = x1 + (x2 - x1) * last_offset
+        ey = y1 + (y2 - y1) * last_offset
+        return (sx, sy, ex, ey, first_color, last_color)
+
+
+def transform_vector(matrix, x1, y1, x2, y2):
+    """Returns the start and end points of a gradient vector transformed by
+    `matrix` as `(x1, y1, x2, y2)`.
+
+    The lines of equal color stay perpendicular to the vector in NanoVG, so
+    unless `matrix` preserves angles, the end point isn't the transformed
+    end point but lies on the normal of the transformed lines of equal color.
+    """
+    dx = x2 - x1
+    dy = y2 - y1
+    x1, y1 = matrix.point_in_matrix_space((x1, y1))
+    determinant = matrix.a * matrix.d - matrix.b * matrix.c
+    if not determinant or not (dx or dy):
+        x2, y2 = matrix.point_in_matrix_space((x2, y2))
+        return x1, y1, x2, y2
+    # The gradient of the color offset, multiplied by the squared length of
+    # the vector, is the vector transformed by the inverse transpose.
+    nx = (matrix.d * dx - matrix.b * dy) / determinant
+    ny = (matrix.a * dy - matrix.c * dx) / determinant
+    scale = (dx * dx + dy * dy) / (nx * nx + ny * ny)
+    return x1, y1, x1 + nx * scale, y1 + ny * scale
+
+def resolve_references(gradients):
+    """Copies inherited stops and attributes from referenced gradients."""
+    def resolve(gradient, visited):
+        if gradient.href is None or gradient.id in visited:
+            return
+        visited.add(gradient.id)
+        referenced = gradients.get(gradient.href)
+        if referenced is None:
+            return
+        resolve(referenced, visited)
+        if not gradient.stops:
+            gradient.stops = list(referenced.stops)
+        for name in INHERITED_ATTRIBUTES:
+            if name not in gradient.attributes and \
+               name in referenced.attributes:
+                gradient.attributes[name] = referenced.attributes[name]
+        gradient.href = None
+
+    for gradient in gradients.values():
+        resolve(gradient, set())
+
+def read_linear_gradients(source):
+    """Returns the linear gradients defined in an SVG document as a dict
+    keyed by id.
+
+    `source` is a filename or a file object.
+    """
+    gradients = dict()
+    gradient = None
+    nodes = list()
+    for event, node in xml.etree.ElementTree.iterparse(
+            source, events=('start', 'end')):
+        tag = get_local_name(node.tag)
+        if event == 'start':
+            nodes.append(node)
+            if tag == 'linearGradient':
+                gradient = LinearGradient(node.get('id'), node.attrib)
+            elif tag == 'stop' and gradient is not None:
+                gradient.add_stop(node.attrib)
+            continue
+
+        if tag == 'linearGradient':
+            if gradient.id is not None:
+                gradients[gradient.id] = gradient
+            gradient = None
+        # Drops read nodes, so large documents aren't kept in memory.
+        nodes.pop()
+        node.clear()
+        if nodes:
+            del nodes[-1][:]
+    resolve_references(gradients)
+    return gradients
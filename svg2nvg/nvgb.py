@@ -0,0 +1,147 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Reader and writer for the `.nvgb` binary drawing format.
+
+An `.nvgb` file stores the same command stream as `oplist.OpList` so that
+drawings can be loaded at runtime instead of being compiled in. All values
+are little-endian and the file is laid out to be memory-mapped and replayed
+in place:
+
+    offset  size  field
+         0     4  magic, b'NVGB'
+         4     2  format version
+         6     2  header size in bytes
+         8     4  canvas width (float32)
+        12     4  canvas height (float32)
+        16     4  number of commands
+        20     4  number of float32 operands
+        24     4  offset of the command stream
+        28     4  offset of the operand payload, 4-byte aligned
+
+The command stream holds one byte per call using the opcodes defined in
+`oplist`. Each opcode consumes a fixed number of operands from the payload,
+in order. Culling regions carry the number of ops and operands to skip, so
+players can jump over invisible content without decoding it. See `c/nvgb.h`
+for the reference C loader and player.
+"""
+
+import array
+import mmap
+import struct
+import sys
+
+from svg2nvg import oplist
+
+
+MAGIC = b'NVGB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHffIIII')
+
+
+class FormatError(Exception):
+    pass
+
+
+def dumps(ops, width=0, height=0):
+    """Returns an `OpList` encoded as `.nvgb` bytes."""
+    oplist.resolve_cull_regions(ops)
+    codes = ops.codes.tobytes()
+    args = array.array('f', ops.args)
+    if sys.byteorder != 'little':
+        args.byteswap()
+
+    codes_offset = HEADER.size
+    args_offset = (codes_offset + len(codes) + 3) & ~3
+    header = HEADER.pack(MAGIC, VERSION, HEADER.size, width, height,
+                         len(ops.codes), len(args), codes_offset, args_offset)
+    padding = b'\0' * (args_offset - codes_offset - len(codes))
+    return b''.join((header, codes, padding, args.tobytes()))
+
+def dump(ops, fileobj, width=0, height=0):
+    fileobj.write(dumps(ops, width, height))
+
+
+class NVGBFile(object):
+    """A read-only view of `.nvgb` data.
+
+    `data` may be any buffer such as `bytes` or an `mmap.mmap`. The command
+    stream and operands are exposed as zero-copy `memoryview` objects.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        view = memoryview(data)
+        if len(view) < HEADER.size:
+            raise FormatError('truncated header')
+
+        (magic, version, header_size, self.width, self.height, command_count,
+         arg_count, codes_offset, args_offset) = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise FormatError('not an .nvgb file')
+        if version != VERSION:
+            raise FormatError('unsupported version %d' % version)
+        if codes_offset + command_count > len(view) or \
+           args_offset % 4 or args_offset + arg_count * 4 > len(view):
+            raise FormatError('truncated payload')
+
+        self.codes = view[codes_offset:codes_offset + command_count]
+        self.args = view[args_offset:args_offset + arg_count * 4].cast('f')
+        if sys.byteorder != 'little':
+            swapped = array.array('f', self.args.tobytes())
+            swapped.byteswap()
+            self.args = memoryview(swapped)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        """Yields `(opcode, operands)` tuples like `OpList`."""
+        args = self.args
+        offset = 0
+        for code in self.codes:
+            if code >= len(oplist.ARITIES):
+                raise FormatError('unknown opcode %d' % code)
+            arity = oplist.ARITIES[code]
+            yield code, tuple(args[offset:offset + arity])
+            offset += arity
+
+    def __len__(self):
+        return len(self.codes)
+
+    def close(self):
+        """Releases the views and closes the underlying memory map."""
+        self.codes.release()
+        self.args.release()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def to_oplist(self):
+        ops = oplist.OpList()
+        for code, args in self:
+            ops.append(code, *args)
+        return ops
+
+
+def open_file(path):
+    """Memory-maps an `.nvgb` file and returns an `NVGBFile`."""
+    with open(path, 'rb') as fileobj:
+        data = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    return NVGBFile(data)
+
+def loads(data):
+    return NVGBFile(data)
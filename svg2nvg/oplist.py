@@ -0,0 +1,475 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Compact intermediate representation of NanoVG calls.
+
+Every call is recorded as an opcode plus a fixed number of numeric operands.
+Opcodes live in a byte array and all operands in a single double array, so a
+recorded drawing costs a few bytes per call and can be analyzed or rewritten
+before any text is produced. Enumerations such as `NVG_ROUND` are stored with
+their numeric NanoVG values and colors as four 0-255 components.
+"""
+
+import array
+import collections
+import decimal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+BEGIN_PATH = 0
+CLOSE_PATH = 1
+MOVE_TO = 2
+LINE_TO = 3
+BEZIER_TO = 4
+QUAD_TO = 5
+ARC_TO = 6
+CIRCLE = 7
+ELLIPSE = 8
+RECT = 9
+PATH_WINDING = 10
+FILL = 11
+STROKE = 12
+FILL_COLOR = 13
+STROKE_COLOR = 14
+FILL_LINEAR_GRADIENT = 15
+STROKE_WIDTH = 16
+LINE_CAP = 17
+LINE_JOIN = 18
+MITER_LIMIT = 19
+SAVE = 20
+RESTORE = 21
+TRANSFORM = 22
+CULL_BEGIN = 23
+CULL_END = 24
+
+# The NanoVG function name and operand kinds of each opcode. Operand kinds
+# are `c` for coordinates, `l` for lengths, `n` for plain numbers, `k` for
+# color components, `e` for enumerations, `b` for culling bounds and `i` for
+# op and operand counts.
+#
+# `CullBegin` and `CullEnd` aren't NanoVG calls but enclose calls that are
+# skipped if the bounds `(min_x, min_y, max_x, max_y)` don't intersect the
+# visible rectangle. The counts tell how many ops and operands to skip, see
+# `resolve_cull_regions()`.
+OPCODES = (
+    ('BeginPath', ''),
+    ('ClosePath', ''),
+    ('MoveTo', 'cc'),
+    ('LineTo', 'cc'),
+    ('BezierTo', 'cccccc'),
+    ('QuadTo', 'cccc'),
+    ('ArcTo', 'ccccl'),
+    ('Circle', 'ccl'),
+    ('Ellipse', 'ccll'),
+    ('Rect', 'ccll'),
+    ('PathWinding', 'e'),
+    ('Fill', ''),
+    ('Stroke', ''),
+    ('FillColor', 'kkkk'),
+    ('StrokeColor', 'kkkk'),
+    ('FillPaint', 'cccckkkkkkkk'),
+    ('StrokeWidth', 'l'),
+    ('LineCap', 'e'),
+    ('LineJoin', 'e'),
+    ('MiterLimit', 'n'),
+    ('Save', ''),
+    ('Restore', ''),
+    ('Transform', 'nnnncc'),
+    ('CullBegin', 'bbbbii'),
+    ('CullEnd', ''),
+)
+
+ARITIES = tuple(len(kinds) for name, kinds in OPCODES)
+
+# The calls that add to the current path without touching any other state.
+GEOMETRY_CODES = frozenset([CLOSE_PATH, MOVE_TO, LINE_TO, BEZIER_TO, QUAD_TO,
+                            ARC_TO, CIRCLE, ELLIPSE, RECT, PATH_WINDING])
+
+# The extra parameters of render functions with culling regions.
+VIEW_PARAMETERS = ('float view_x', 'float view_y', 'float view_width',
+                   'float view_height')
+
+# NanoVG enumeration values.
+NVG_BUTT = 0
+NVG_ROUND = 1
+NVG_SQUARE = 2
+NVG_BEVEL = 3
+NVG_MITER = 4
+NVG_SOLID = 1
+NVG_HOLE = 2
+
+ENUM_NAMES = {
+    LINE_CAP: {NVG_BUTT: 'NVG_BUTT', NVG_ROUND: 'NVG_ROUND',
+               NVG_SQUARE: 'NVG_SQUARE'},
+    LINE_JOIN: {NVG_BEVEL: 'NVG_BEVEL', NVG_MITER: 'NVG_MITER',
+                NVG_ROUND: 'NVG_ROUND'},
+    PATH_WINDING: {NVG_HOLE: 'NVG_HOLE', NVG_SOLID: 'NVG_SOLID'},
+}
+
+
+class OpList(object):
+    """An append-only list of NanoVG calls backed by two flat arrays."""
+
+    def __init__(self):
+        self.codes = array.array('B')
+        self.args = array.array('d')
+
+    def __iter__(self):
+        """Yields `(opcode, operands)` tuples in recorded order."""
+        args = self.args
+        offset = 0
+        for code in self.codes:
+            arity = ARITIES[code]
+            yield code, tuple(args[offset:offset + arity])
+            offset += arity
+
+    def __len__(self):
+        return len(self.codes)
+
+    def append(self, code, *args):
+        self.codes.append(code)
+        if args:
+            self.args.extend(args)
+
+    def clear(self):
+        del self.codes[:]
+        del self.args[:]
+
+    def extend(self, other):
+        self.codes.extend(other.codes)
+        self.args.extend(other.args)
+
+
+def iter_geometry_runs(ops):
+    """Yields `(start, stop)` op index ranges of consecutive calls that only
+    build paths, such as `MoveTo` and `Rect`.
+    """
+    start = None
+    for index, code in enumerate(ops.codes):
+        if code in GEOMETRY_CODES:
+            if start is None:
+                start = index
+        elif start is not None:
+            yield start, index
+            start = None
+    if start is not None:
+        yield start, len(ops.codes)
+
+def iter_coordinate_offsets(ops):
+    """Yields the operand offsets of coordinates."""
+    coordinate_offsets = tuple(
+        tuple(i for i, kind in enumerate(kinds) if kind == 'c')
+        for name, kinds in OPCODES)
+    offset = 0
+    for code in ops.codes:
+        for i in coordinate_offsets[code]:
+            yield offset + i
+        offset += ARITIES[code]
+
+def quantize(ops, decimals=None, grid=None):
+    """Rounds coordinates in place.
+
+    Values are first snapped to multiples of `grid`, if specified, and then
+    rounded to `decimals` decimal places, if specified. Lengths such as
+    stroke widths and radii are left untouched, as rounding them could make
+    thin strokes and small shapes disappear, and so are matrix coefficients,
+    colors and other numbers. Returns the maximum absolute
+    error introduced to a single coordinate.
+    """
+    if grid is not None and decimals is None:
+        # Avoids float noise such as 0.30000000000000004 for a 0.1 grid.
+        exponent = decimal.Decimal(repr(float(grid))).as_tuple().exponent
+        decimals = max(0, -exponent)
+
+    if numpy is not None and (decimals is None or 0 <= decimals <= 22):
+        max_error = quantize_vectorized(ops, decimals, grid)
+        if max_error is not None:
+            return max_error
+
+    args = ops.args
+    max_error = 0
+    for offset in iter_coordinate_offsets(ops):
+        value = args[offset]
+        quantized = value
+        if grid:
+            quantized = round(quantized / grid) * grid
+        if decimals is not None:
+            quantized = round(quantized, decimals)
+        if quantized != value:
+            args[offset] = quantized
+            error = abs(quantized - value)
+            if error > max_error:
+                max_error = error
+    return max_error
+
+def get_coordinate_mask(ops):
+    """Returns a NumPy boolean array telling which operands are coordinates.
+    """
+    width = max(ARITIES)
+    kinds = numpy.zeros((len(OPCODES), width), dtype=bool)
+    present = numpy.zeros((len(OPCODES), width), dtype=bool)
+    for code, (name, code_kinds) in enumerate(OPCODES):
+        for i, kind in enumerate(code_kinds):
+            kinds[code, i] = kind == 'c'
+            present[code, i] = True
+    codes = numpy.frombuffer(ops.codes, dtype=numpy.uint8)
+    return kinds[codes][present[codes]]
+
+def get_product_error(a, b, product):
+    """Returns the NumPy array of the rounding errors of `product = a * b`,
+    so `product + error` is the exact product (Dekker's algorithm).
+    """
+    def split(values):
+        scaled = 134217729.0 * values
+        high = scaled - (scaled - values)
+        return high, values - high
+    a_high, a_low = split(a)
+    b_high, b_low = split(b)
+    return ((a_high * b_high - product) + a_high * b_low +
+            a_low * b_high) + a_low * b_low
+
+def round_vectorized(values, decimals):
+    """Returns `round(value, decimals)` of every value in a NumPy array of
+    finite floats, for `decimals` from 0 to 22.
+
+    Like `round()`, values are rounded half to even by their exact decimal
+    value, which the scaled floats alone don't tell apart from values just
+    below or above a tie.
+    """
+    scale = 10.0 ** decimals
+    # Rounding half to even is symmetric, so only magnitudes are rounded.
+    magnitudes = numpy.abs(values)
+    with numpy.errstate(over='ignore', invalid='ignore'):
+        scaled = magnitudes * scale
+        error = get_product_error(magnitudes, scale, scaled)
+        floor = numpy.floor(scaled)
+        # Exact wherever the fraction is close to a tie.
+        excess = (scaled - floor) - 0.5
+        up = (excess > -error) | \
+            ((excess == -error) & (numpy.fmod(floor, 2) != 0))
+    rounded = numpy.copysign((floor + up) / scale, values)
+    # Scaled values this large may lose the integer part.
+    for i in numpy.flatnonzero(~(scaled < 2 ** 52)).tolist():
+        rounded[i] = round(float(values[i]), decimals)
+    return rounded
+
+def quantize_vectorized(ops, decimals, grid):
+    """Does the same as `quantize()` with NumPy, giving the same results as
+    Python's `round()`. Returns `None` without changing anything if there are
+    infinite or NaN values, which `round()` rejects.
+    """
+    offsets = numpy.flatnonzero(get_coordinate_mask(ops))
+    args = numpy.frombuffer(ops.args, dtype=numpy.float64)
+    values = args[offsets]
+    if not numpy.isfinite(values).all():
+        return None
+    quantized = values
+    if grid:
+        # Adding 0.0 turns -0.0 into 0.0 like `round()` returning an int.
+        quantized = (numpy.rint(quantized / grid) + 0.0) * grid
+    if decimals is not None:
+        quantized = round_vectorized(quantized, decimals)
+
+    changed = quantized != values
+    args[offsets[changed]] = quantized[changed]
+    # Releases the buffer, which would keep the operands from growing.
+    del args
+    if not changed.any():
+        return 0
+    return float(numpy.abs(quantized[changed] - values[changed]).max())
+
+def resolve_cull_regions(ops):
+    """Updates the skip counts of all culling regions in place.
+
+    The op count includes the closing `CullEnd` and the operand count
+    excludes the operands of `CullBegin` itself.
+    """
+    args = ops.args
+    begins = list()
+    op_offset = arg_offset = 0
+    for code in ops.codes:
+        if code == CULL_BEGIN:
+            begins.append((op_offset, arg_offset))
+        elif code == CULL_END:
+            begin_op_offset, begin_arg_offset = begins.pop()
+            args[begin_arg_offset + 4] = op_offset - begin_op_offset
+            args[begin_arg_offset + 5] = \
+                arg_offset - begin_arg_offset - ARITIES[CULL_BEGIN]
+        op_offset += 1
+        arg_offset += ARITIES[code]
+
+def widen_cull_bounds(ops, margin):
+    """Widens the bounds of all culling regions in place by `margin`, so they
+    still enclose coordinates that were moved by up to `margin` after the
+    bounds were computed.
+    """
+    args = ops.args
+    arg_offset = 0
+    for code in ops.codes:
+        if code == CULL_BEGIN:
+            args[arg_offset] -= margin
+            args[arg_offset + 1] -= margin
+            args[arg_offset + 2] += margin
+            args[arg_offset + 3] += margin
+        arg_offset += ARITIES[code]
+
+def format_color(red, green, blue, alpha):
+    return 'nvgRGBA(%d, %d, %d, %d)' % (red, green, blue, alpha)
+
+def format_color_operand(args, colors=None):
+    """Returns the C expression of a color, looked up in `colors` first."""
+    if colors is not None:
+        try:
+            return colors[args]
+        except KeyError:
+            pass
+    return format_color(*args)
+
+class FormattedColors(dict):
+    """Maps colors to their `nvgRGBA()` literals, formatting each one once."""
+
+    def __missing__(self, args):
+        literal = format_color(*args)
+        self[args] = literal
+        return literal
+
+def get_color_table(ops_lists, name='kColors'):
+    """Returns the distinct colors used by `OpList`s in order of first use.
+
+    The result maps `(red, green, blue, alpha)` tuples to elements of a table
+    called `name`, which can be passed as `colors` to `iter_stmts()`.
+    """
+    colors = collections.OrderedDict()
+    for ops in ops_lists:
+        for code, args in ops:
+            if code == FILL_COLOR or code == STROKE_COLOR:
+                operands = (args,)
+            elif code == FILL_LINEAR_GRADIENT:
+                operands = (args[4:8], args[8:12])
+            else:
+                continue
+            for operand in operands:
+                if operand not in colors:
+                    colors[operand] = '%s[%d]' % (name, len(colors))
+    return colors
+
+def format_color_table(colors, name='kColors'):
+    """Returns the C definition of a table created by `get_color_table()`.
+
+    Components are divided like `nvgRGBA()` does, so the colors are exactly
+    the same without constructing them at runtime.
+    """
+    lines = ['static const NVGcolor %s[] = {' % name]
+    for args in colors:
+        lines.append('  {{{%s}}},' % ', '.join('%d / 255.0f' % arg
+                                              for arg in args))
+    lines.append('};')
+    return '\n'.join(lines)
+
+def format_linear_gradient(args, context='context', colors=None):
+    return 'nvgLinearGradient(%s, %s, %s)' % \
+           (context, ', '.join(str(arg) for arg in args[:4]),
+            ', '.join((format_color_operand(args[4:8], colors),
+                       format_color_operand(args[8:12], colors))))
+
+def format_stmt(code, args, context='context', paints=None, colors=None):
+    """Returns the C statements of a single call as a list of strings.
+
+    `paints` maps the operands of `FillPaint` calls to the names of
+    variables holding the paint, which is otherwise created inline. `colors`
+    maps `(red, green, blue, alpha)` tuples to C expressions used instead of
+    `nvgRGBA()` literals.
+    """
+    name = OPCODES[code][0]
+    if code == CULL_BEGIN:
+        return ['if (view_x <= %r && view_y <= %r && '
+                '%r <= view_x + view_width && %r <= view_y + view_height) {' %
+                (args[2], args[3], args[0], args[1])]
+    elif code == CULL_END:
+        return ['}']
+    elif not args:
+        return ['nvg%s(%s);' % (name, context)]
+
+    if code == FILL_COLOR or code == STROKE_COLOR:
+        operands = format_color_operand(args, colors)
+    elif code == FILL_LINEAR_GRADIENT:
+        if paints is not None and args in paints:
+            operands = paints[args]
+        else:
+            operands = format_linear_gradient(args, context, colors)
+    elif code in ENUM_NAMES:
+        operands = ENUM_NAMES[code][int(args[0])]
+    else:
+        operands = ', '.join(str(arg) for arg in args)
+    return ['nvg%s(%s, %s);' % (name, context, operands)]
+
+def get_stmt_templates(context='context'):
+    """Returns a `%` format string per opcode taking the operands of calls
+    with only numeric operands, which `format_stmt()` would render the same,
+    or `None` for the other opcodes.
+    """
+    templates = list()
+    for name, kinds in OPCODES:
+        if kinds and all(kind in 'cln' for kind in kinds):
+            # The repr() of a float is its str().
+            templates.append('nvg%s(%s, %s);' % (
+                name, context.replace('%', '%%'),
+                ', '.join(['%r'] * len(kinds))))
+        else:
+            templates.append(None)
+    return tuple(templates)
+
+def iter_stmts(ops, context='context', colors=None, replacements=None):
+    """Lazily renders an `OpList` into C statements.
+
+    Each distinct gradient paint is declared once at the top and referenced
+    by the calls using it. `colors` is passed to `format_stmt()`, colors it
+    doesn't contain are only formatted once.
+    `replacements` maps op indices to `(stop, stmt)` tuples, the ops from the
+    index up to `stop` are rendered as the single statement `stmt` instead.
+    """
+    colors = FormattedColors(colors or ())
+    paints = dict()
+    if FILL_LINEAR_GRADIENT in ops.codes:
+        for code, args in ops:
+            if code == FILL_LINEAR_GRADIENT and args not in paints:
+                paints[args] = 'paint%d' % len(paints)
+                yield 'NVGpaint %s = %s;' % (
+                    paints[args],
+                    format_linear_gradient(args, context, colors))
+
+    templates = get_stmt_templates(context)
+    indent = ''
+    stop = 0
+    for index, (code, args) in enumerate(ops):
+        if index < stop:
+            continue
+        if replacements and index in replacements:
+            stop, stmt = replacements[index]
+            yield indent + stmt
+            continue
+        template = templates[code]
+        if template is not None:
+            yield indent + template % args
+            continue
+        if code == CULL_END:
+            indent = indent[2:]
+        for stmt in format_stmt(code, args, context, paints, colors):
+            yield indent + stmt
+        if code == CULL_BEGIN:
+            indent += '  '
@@ -0,0 +1,148 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Peephole optimizer for recorded NanoVG calls.
+
+The passes only remove calls whose absence cannot change what is drawn:
+
+* `nvgTransform()` with the identity matrix.
+* `nvgSave()` immediately followed by `nvgRestore()`, and empty culling
+  regions.
+* State setters that assign the value the state already has.
+* State setters that are overwritten or discarded by `nvgRestore()` before
+  any `nvgFill()` or `nvgStroke()` reads them.
+
+State left behind at the end of the stream is considered used, since the
+caller of the generated function may depend on it. Calls inside culling
+regions may or may not run, so state after a region is only known where both
+outcomes agree.
+"""
+
+from svg2nvg import oplist
+
+
+# Maps state setters to the piece of NanoVG state they assign.
+STATE_KEYS = {
+    oplist.FILL_COLOR: 'fill',
+    oplist.FILL_LINEAR_GRADIENT: 'fill',
+    oplist.STROKE_COLOR: 'stroke',
+    oplist.STROKE_WIDTH: 'stroke_width',
+    oplist.LINE_CAP: 'linecap',
+    oplist.LINE_JOIN: 'linejoin',
+    oplist.MITER_LIMIT: 'miterlimit',
+}
+
+# The state each drawing call reads.
+STATE_USES = {
+    oplist.FILL: frozenset(['fill']),
+    oplist.STROKE: frozenset(['stroke', 'stroke_width', 'linecap',
+                              'linejoin', 'miterlimit']),
+}
+
+ALL_STATE_KEYS = frozenset(STATE_KEYS.values())
+
+IDENTITY_TRANSFORM = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# Opening and closing calls that can be dropped if nothing is between them.
+EMPTY_PAIRS = ((oplist.SAVE, oplist.RESTORE),
+               (oplist.CULL_BEGIN, oplist.CULL_END))
+
+
+def remove_identity_transforms(ops):
+    return [op for op in ops
+            if op[0] != oplist.TRANSFORM or op[1] != IDENTITY_TRANSFORM]
+
+def remove_empty_saves(ops):
+    result = list()
+    for op in ops:
+        if result and (result[-1][0], op[0]) in EMPTY_PAIRS:
+            result.pop()
+        else:
+            result.append(op)
+    return result
+
+def remove_redundant_setters(ops):
+    """Drops setters that assign the value the state already has."""
+    result = list()
+    state = dict()
+    saved_states = list()
+    skipped_states = list()
+    for op in ops:
+        code, args = op
+        if code == oplist.SAVE:
+            saved_states.append(dict(state))
+        elif code == oplist.RESTORE:
+            state = saved_states.pop() if saved_states else dict()
+        elif code == oplist.CULL_BEGIN:
+            skipped_states.append(dict(state))
+        elif code == oplist.CULL_END:
+            skipped_state = skipped_states.pop()
+            state = dict((key, value) for key, value in state.items()
+                         if skipped_state.get(key) == value)
+        elif code == oplist.FILL_LINEAR_GRADIENT:
+            # Paints depend on the current transform so they never match.
+            state.pop('fill', None)
+        elif code in STATE_KEYS:
+            key = STATE_KEYS[code]
+            if state.get(key) == op:
+                continue
+            state[key] = op
+        result.append(op)
+    return result
+
+def remove_dead_setters(ops):
+    """Drops setters whose value is never read by a drawing call."""
+    result = list()
+    live = set(ALL_STATE_KEYS)
+    saved_lives = list()
+    skipped_lives = list()
+    for op in reversed(ops):
+        code = op[0]
+        if code in STATE_USES:
+            live |= STATE_USES[code]
+        elif code in STATE_KEYS:
+            key = STATE_KEYS[code]
+            if key not in live:
+                continue
+            live.discard(key)
+        elif code == oplist.RESTORE:
+            saved_lives.append(live)
+            live = set()
+        elif code == oplist.SAVE and saved_lives:
+            live |= saved_lives.pop()
+        elif code == oplist.CULL_END:
+            skipped_lives.append(set(live))
+        elif code == oplist.CULL_BEGIN:
+            live |= skipped_lives.pop()
+        result.append(op)
+    result.reverse()
+    return result
+
+def optimize(ops):
+    """Returns an optimized copy of an `OpList` and the number of removed
+    calls.
+    """
+    stmts = list(ops)
+    count = len(stmts) + 1
+    while len(stmts) < count:
+        count = len(stmts)
+        stmts = remove_identity_transforms(stmts)
+        stmts = remove_empty_saves(stmts)
+        stmts = remove_redundant_setters(stmts)
+        stmts = remove_dead_setters(stmts)
+
+    result = oplist.OpList()
+    for code, args in stmts:
+        result.append(code, *args)
+    return result, len(ops) - len(result)
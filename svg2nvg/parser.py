@@ -12,13 +12,144 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import concurrent.futures
+import contextlib
+import copy
+import io
+import math
+import multiprocessing
 import os
-import re
+import pickle
 
 import svgelements
+from svg2nvg import bboxes
+from svg2nvg import datatable
 from svg2nvg import definitions
 from svg2nvg import generator
+from svg2nvg import gradients
+from svg2nvg import nvgb
+from svg2nvg import oplist
+from svg2nvg import optimizer
+from svg2nvg import simplify
+from svg2nvg import state
+from svg2nvg import stats
+from svg2nvg import stream
+from svg2nvg import subroutines
+
+
+# The properties that may change inside a culling region.
+CULLED_PROPERTIES = ('fill', 'linecap', 'linejoin', 'miterlimit', 'stroke',
+                     'stroke_width')
+
+# NanoVG's default miter limit.
+DEFAULT_MITER_LIMIT = 10
+
+# The number of ranges of top-level elements per worker process when walking
+# in parallel, so workers that finish early can take over more work.
+RANGES_PER_JOB = 4
+
+# The parser and top-level elements of a parallel walk, which worker
+# processes inherit by forking.
+_shared_walk = None
+
+
+def get_bbox(element):
+    """Returns the untransformed bounding box of a shape."""
+    if isinstance(element, svgelements.Path):
+        return bboxes.get_path_bbox(element)
+    return element.bbox(transformed=False)
+
+def union_bounds(bounds, other):
+    if bounds is None:
+        return other
+    if other is None:
+        return bounds
+    return (min(bounds[0], other[0]), min(bounds[1], other[1]),
+            max(bounds[2], other[2]), max(bounds[3], other[3]))
+
+class HandlerRegistry(object):
+    """Maps classes to handlers.
+
+    A handler applies to instances of its class and all subclasses. If
+    several registered classes match, the one nearest in the method
+    resolution order wins. Lookups are cached per concrete type.
+    """
+
+    def __init__(self, handlers=None):
+        self.handlers = dict(handlers or ())
+        self.cache = dict()
 
+    def copy(self):
+        return HandlerRegistry(self.handlers)
+
+    def lookup(self, cls):
+        """Returns the handler of `cls` or `None` if there is none."""
+        try:
+            return self.cache[cls]
+        except KeyError:
+            pass
+
+        handler = None
+        for base in cls.__mro__:
+            if base in self.handlers:
+                handler = self.handlers[base]
+                break
+        self.cache[cls] = handler
+        return handler
+
+    def register(self, cls, handler):
+        self.handlers[cls] = handler
+        self.cache.clear()
+
+def get_weight(element):
+    """Returns a rough measure of the work of drawing an element."""
+    if isinstance(element, svgelements.Group):
+        return 1 + sum(get_weight(child) for child in element)
+    if isinstance(element, svgelements.Path):
+        return 1 + len(element)
+    return 1
+
+def split_elements(elements, count):
+    """Splits `elements` into at most `count` contiguous ranges of similar
+    weight. Returns a list of `(start, stop)` tuples.
+    """
+    weights = [get_weight(element) for element in elements]
+    target = sum(weights) / count
+    ranges = list()
+    start = 0
+    weight = 0
+    for index, element_weight in enumerate(weights):
+        weight += element_weight
+        if weight >= target * (len(ranges) + 1) and index + 1 < len(weights):
+            ranges.append((start, index + 1))
+            start = index + 1
+    if start < len(weights):
+        ranges.append((start, len(weights)))
+    return ranges
+
+def get_state_key(values, path_began):
+    """Returns bytes that are equal for walk states only if walking from
+    either records the same calls.
+    """
+    return pickle.dumps((sorted(values.items()), path_began))
+
+def _walk_range(start, stop, values, path_began):
+    svg_parser, elements = _shared_walk
+    return svg_parser.walk_elements(elements[start:stop], values, path_began)
+
+def get_parameters(context='context', culls=False):
+    """Returns the parameter list of a render function."""
+    parameters = ['NVGcontext *%s' % context]
+    if culls:
+        parameters.extend(oplist.VIEW_PARAMETERS)
+    return ', '.join(parameters)
+
+def get_title(filename):
+    """Returns the name generated functions and classes of a file are based
+    on, e.g. `MyIcon` for `my_icon.svg`.
+    """
+    basename = os.path.splitext(os.path.basename(filename))[0]
+    return basename.title().replace('_', '')
 
 def element(method):
     """Decorator for parsing a element.
@@ -29,6 +160,8 @@ def element(method):
     def inner(*args, **kwargs):
         self = args[0]
         element = args[1]
+        if self.stats is not None:
+            self.stats.elements[element.values.get('tag', 'unknown')] += 1
         element.properties = self.get_properties(element)
         if self.begin_element(element):
             method(*args, **kwargs)
@@ -36,16 +169,142 @@ def element(method):
     return inner
 
 
+class WalkResult(object):
+    """The calls recorded for a range of top-level elements, along with the
+    walk state they started from and the changes they made to it.
+    """
+
+    def __init__(self, start_key, ops, changes, path_began, last_element,
+                 stats):
+        self.start_key = start_key
+        self.ops = ops
+        # The effective values of the properties that were set.
+        self.changes = changes
+        self.path_began = path_began
+        self.last_element = last_element
+        self.stats = stats
+
+
 class SVGParser(object):
 
-    def __init__(self, context='context'):
+    def __init__(self, context='context', bakes_transforms=False,
+                 culls=False, collects_stats=False):
         self.context = context
+        self.bakes_transforms = bakes_transforms
+        self.culls = culls
+        self.collects_stats = collects_stats
+        self.stats = None
+        self.bounds = list()
         self.groups = list()
         self.linear_gradients = dict()
-        self.stmts = list()
-        self.properties = list()
+        self.last_linear_gradient = None
+        self.paint_references = dict()
+        self.paints = dict()
+        self.ops = oplist.OpList()
+        self.properties = state.PropertyStack()
+        self.path_began = False
+        self.jobs = 1
+
+    @property
+    def stmts(self):
+        """The recorded calls rendered as a list of C statements."""
+        return list(self.iter_stmts())
+
+    def __bake_transform(self, element):
+        """Returns an element with its transform applied to its geometry.
+
+        Circles under a similarity transform stay circles, every other shape
+        is converted to a path.
+        """
+        matrix = element.transform
+        if isinstance(element, svgelements.Circle) and \
+           math.isclose(matrix.a * matrix.a + matrix.b * matrix.b,
+                        matrix.c * matrix.c + matrix.d * matrix.d) and \
+           math.isclose(matrix.a * matrix.c + matrix.b * matrix.d, 0,
+                        abs_tol=1e-9):
+            scale = math.sqrt(abs(matrix.determinant))
+            circle = copy.copy(element)
+            circle.cx, circle.cy = matrix.point_in_matrix_space(
+                (element.cx, element.cy))
+            circle.rx = circle.ry = element.rx * scale
+            if circle.stroke_width is not None:
+                circle.stroke_width = element.stroke_width * scale
+            circle.transform = svgelements.Matrix()
+            return circle
+
+        path = abs(svgelements.Path(element))
+        segments = list()
+        for segment in path:
+            if isinstance(segment, svgelements.Arc):
+                segments.extend(segment.as_cubic_curves())
+            else:
+                segments.append(segment)
+        path[:] = segments
+        return path
+
+    def __begin_culling(self, element):
+        element.cull_offset = len(self.ops.args)
+        element.cull_state = dict(
+            (name, self.properties.get(name))
+            for name in CULLED_PROPERTIES)
+        self.bounds.append(None)
+        self.path_began = False
+        self.generator.cull_begin()
+
+    def __end_culling(self, element):
+        self.generator.cull_end()
+        bounds = self.bounds.pop()
+        if bounds is not None:
+            for i, value in enumerate(bounds):
+                self.ops.args[element.cull_offset + i] = value
+        if self.bounds:
+            self.bounds[-1] = union_bounds(self.bounds[-1], bounds)
+
+        # The region may be skipped at runtime, so properties it changed are
+        # no longer known afterwards.
+        for name, value in element.cull_state.items():
+            if self.properties.get(name) != value:
+                self.properties.set(name, None)
         self.path_began = False
 
+    def __get_bounds(self, element):
+        """Returns the conservative bounds of a shape as drawn, in the
+        coordinate space of the render function.
+        """
+        bbox = get_bbox(element)
+        if bbox is None:
+            return None
+
+        matrix = self.properties.get('matrix')
+        min_x, min_y, max_x, max_y = bbox
+        points = [matrix.point_in_matrix_space(point) for point in
+                  ((min_x, min_y), (max_x, min_y), (min_x, max_y),
+                   (max_x, max_y))]
+        xs = [point.x for point in points]
+        ys = [point.y for point in points]
+
+        margin = 0
+        stroke = element.properties.get('stroke')
+        stroke_width = element.properties.get('stroke_width')
+        if isinstance(stroke, svgelements.Color) and stroke.opacity and \
+           stroke_width:
+            # Miter joins and square caps reach beyond half the stroke width.
+            factor = 1
+            if self.properties.get('linejoin') in \
+               (None, 'miter'):
+                miter_limit = self.properties.get('miterlimit')
+                if miter_limit is None:
+                    miter_limit = DEFAULT_MITER_LIMIT
+                factor = max(float(miter_limit), factor)
+            if self.properties.get('linecap') == 'square':
+                factor = max(math.sqrt(2), factor)
+            scale = max(math.hypot(matrix.a, matrix.b),
+                        math.hypot(matrix.c, matrix.d))
+            margin = float(stroke_width) / 2 * factor * scale
+
+        return (min(xs) - margin, min(ys) - margin,
+                max(xs) + margin, max(ys) + margin)
+
     def __begin_path(self, element):
         if self.path_began is True and \
            self.__check_property_changed(element, 'fill', 'stroke'):
@@ -57,11 +316,8 @@ class SVGParser(object):
     def __end_path(self, element):
         self.__process_properties(element, 'stroke_width', 'stroke')
 
-        try:
-            fill_id_match = re.match(r'url\(#(.*)\)', element.values['fill'])
-            fill_id = fill_id_match.group(1)
-            gradient = self.linear_gradients[fill_id]
-        except:
+        gradient = self.__get_linear_gradient(element)
+        if gradient is None:
             self.__process_property(element, 'fill')
         else:
             self.__fill_linear_gradient(element, gradient)
@@ -70,40 +326,66 @@ class SVGParser(object):
             self.__restore(element)
 
     def __fill_linear_gradient(self, element, gradient):
-        if not gradient.stops:
+        paint = self.__get_paint(element, gradient)
+        if not isinstance(paint, tuple):
+            if paint is not None:
+                element.properties['fill'] = paint
             self.__process_property(element, 'fill')
             return
 
-        keys = list(gradient.stops.keys())
-        keys.sort()
-        first_offset = keys[0]
-        last_offset = keys[1]
-
-        first_color = gradient.stops[first_offset]
-        last_color = gradient.stops[last_offset]
-
-        if first_color == last_color:
-            element.properties['fill'] = first_color
-            self.__process_property(element, 'fill')
-            return
-
-        values = gradient.values
-        x1 = float(values['x1'])
-        y1 = float(values['y1'])
-        x2 = float(values['x2'])
-        y2 = float(values['y2'])
-
-        sx = x1 + (x2 - x1) * first_offset
-        sy = y1 + (y2 - y1) * first_offset
-        ex = x1 + (x2 - x1) * last_offset
-        ey = y1 + (y2 - y1) * last_offset
-
+        sx, sy, ex, ey, first_color, last_color = paint
         get_color = self.generator.get_color_by_object
         self.generator.linear_gradient(sx, sy, ex, ey,
                                        get_color(first_color),
                                        get_color(last_color))
+        # The fill color is replaced by the paint.
+        self.properties.set('fill', None)
         self.path_began = False
 
+    def __get_linear_gradient(self, element):
+        """Returns the gradient an element's fill refers to or `None`."""
+        fill = element.values.get('fill')
+        try:
+            return self.paint_references[fill]
+        except KeyError:
+            pass
+        except TypeError:
+            return None
+
+        match = gradients.URL_PATTERN.match(fill) if \
+                isinstance(fill, str) else None
+        gradient = self.linear_gradients.get(match.group(1)) if match else None
+        if gradient is not None and gradient.href is not None:
+            gradients.resolve_references(self.linear_gradients)
+        self.paint_references[fill] = gradient
+        return gradient
+
+    def __get_paint(self, element, gradient):
+        """Returns `LinearGradient.get_paint()` of an element, resolved once
+        per gradient, bounding box and baked transform.
+        """
+        matrix = None
+        if self.bakes_transforms:
+            # The composed transform the coordinates were baked with.
+            matrix = svgelements.Matrix(element.values.get('transform', ''))
+            if matrix.is_identity():
+                matrix = None
+        if gradient.attributes.get('gradientUnits') == 'userSpaceOnUse':
+            bbox = None
+        elif matrix is None:
+            bbox = get_bbox(element)
+        else:
+            bbox = get_bbox(abs(svgelements.Path(element) * ~matrix))
+        key = (gradient.id, bbox, None if matrix is None else
+               (matrix.a, matrix.b, matrix.c, matrix.d, matrix.e, matrix.f))
+        try:
+            return self.paints[key]
+        except KeyError:
+            paint = gradient.get_paint(bbox, self.canvas_width,
+                                       self.canvas_height, matrix)
+            self.paints[key] = paint
+            return paint
+
     @element
     def __parse_circle(self, element):
         self.generator.circle(element.cx, element.cy, element.rx)
@@ -114,36 +396,96 @@ class SVGParser(object):
 
     @element
     def __parse_group(self, group):
-        for child in group:
+        if group is self.root and self.jobs > 1:
+            self.__parse_children_in_parallel(group)
+        else:
+            self.__parse_children(group)
+
+        while group.save_count > 0:
+            self.__restore(group)
+
+    def __parse_children(self, children):
+        for child in children:
             try:
                 if child.values['visibility'] == 'hidden':
                     continue
             except (KeyError, AttributeError):
                 pass
 
-            if isinstance(child, svgelements.Circle):
-                self.__parse_circle(child)
-            elif isinstance(child, svgelements.Ellipse):
-                self.__parse_ellipse(child)
-            elif isinstance(child, svgelements.Group):
-                self.__parse_group(child)
-            elif isinstance(child, svgelements.Path):
-                self.__parse_path(child)
-            elif isinstance(child, svgelements.Polygon):
-                self.__parse_polygon(child)
-            elif isinstance(child, svgelements.Polyline):
-                self.__parse_polyline(child)
-            elif isinstance(child, svgelements.Rect):
-                self.__parse_rect(child)
-            elif isinstance(child, svgelements.SimpleLine):
-                self.__parse_line(child)
-            elif isinstance(child, svgelements.SVGElement):
-                self.__parse_other_element(child)
-            elif isinstance(child, svgelements.Shape):
-                print(" !! Unsupported shape:", element.__class__)
+            if self.bakes_transforms and \
+               isinstance(child, svgelements.Shape) and \
+               not child.transform.is_identity():
+                child = self.__bake_transform(child)
+
+            handler = self.element_handlers.lookup(type(child))
+            if handler is not None:
+                handler(self, child)
+
+    def __parse_children_in_parallel(self, children):
+        """Walks the children of the root in worker processes.
+
+        The calls of an element depend on the state left behind by its
+        preceding siblings, which workers can't wait for. So every range of
+        children is first walked from the state before the first child, and
+        again with the changes the ranges before it made in their first walk
+        if that differs. Results are merged in document order, each from a
+        walk that started from the actual state at that point. A range
+        without such a result is walked once more from the actual state, so
+        the recorded calls are always the same as those of a sequential walk.
+        """
+        global _shared_walk
 
-        while group.save_count > 0:
-            self.__restore(group)
+        children = list(children)
+        ranges = split_elements(children, self.jobs * RANGES_PER_JOB)
+        if len(ranges) < 2 or \
+           'fork' not in multiprocessing.get_all_start_methods():
+            self.__parse_children(children)
+            return
+
+        _shared_walk = (self, children)
+        executor = concurrent.futures.ProcessPoolExecutor(
+            self.jobs, multiprocessing.get_context('fork'))
+        try:
+            values = self.properties.snapshot()
+            first_key = get_state_key(values, self.path_began)
+            guesses = [executor.submit(_walk_range, start, stop, values,
+                                       self.path_began)
+                       for start, stop in ranges]
+            guess_values = dict(values)
+            retries = [None]
+            for guess, (start, stop) in zip(guesses, ranges[1:]):
+                guess = guess.result()
+                guess_values.update(guess.changes)
+                if get_state_key(guess_values, guess.path_began) == first_key:
+                    retries.append(None)
+                else:
+                    retries.append(executor.submit(
+                        _walk_range, start, stop, dict(guess_values),
+                        guess.path_began))
+
+            for index, (start, stop) in enumerate(ranges):
+                values = self.properties.snapshot()
+                key = get_state_key(values, self.path_began)
+                for future in (guesses[index], retries[index]):
+                    if future is not None and future.result().start_key == key:
+                        result = future.result()
+                        break
+                else:
+                    result = executor.submit(_walk_range, start, stop, values,
+                                             self.path_began).result()
+                self.__merge_walk_result(result)
+        finally:
+            executor.shutdown(cancel_futures=True)
+            _shared_walk = None
+
+    def __merge_walk_result(self, result):
+        self.ops.extend(result.ops)
+        self.properties.update(result.changes)
+        self.path_began = result.path_began
+        if result.last_element is not None:
+            self.last_element = result.last_element
+        if self.stats is not None:
+            self.stats.merge(result.stats)
 
     @element
     def __parse_line(self, element):
@@ -151,11 +493,22 @@ class SVGParser(object):
         self.generator.line_to(element.x2, element.y2)
 
     def __parse_linear_gradient(self, element):
-        self.linear_gradients[element.id] = element
-        element.stops = dict()
+        if element.id in self.linear_gradients:
+            # Already read from the document source.
+            self.last_linear_gradient = None
+            return
+        gradient = gradients.LinearGradient(element.id,
+                                            element.values['attributes'])
+        self.linear_gradients[element.id] = gradient
+        self.last_linear_gradient = gradient
+        self.paint_references.clear()
+        if self.stats is not None:
+            self.stats.elements['linearGradient'] += 1
 
     def __parse_other_element(self, element):
         tag = element.values['tag']
+        if self.stats is not None and tag != 'linearGradient':
+            self.stats.elements[tag] += 1
         if tag == 'linearGradient':
             self.__parse_linear_gradient(element)
         elif tag == 'stop':
@@ -163,36 +516,44 @@ class SVGParser(object):
 
     @element
     def __parse_path(self, element):
-        subpath_count = 0
+        self.subpath_count = 0
+        lookup = self.segment_handlers.lookup
         for segment in element:
-            if (isinstance(segment, svgelements.svgelements.Arc)):
-                pass
-            elif (isinstance(segment, svgelements.svgelements.Close)):
-                self.generator.close_path()
-                if subpath_count > 1:
-                    self.generator.path_winding_hole()
-            elif (isinstance(segment, svgelements.svgelements.CubicBezier)):
-                control1 = segment.control1
-                control2 = segment.control2
-                point = segment.end
-                self.generator.bezier_to(control1.x, control1.y,
-                                         control2.x, control2.y,
-                                         point.x, point.y)
-            elif (isinstance(segment, svgelements.svgelements.Line)):
-                point = segment.end
-                self.generator.line_to(point.x, point.y)
-            elif (isinstance(segment, svgelements.svgelements.Move)):
-                subpath_count += 1
-                point = segment.end
-                self.generator.move_to(point.x, point.y)
-            elif (isinstance(segment, svgelements.svgelements.QuadraticBezier)):
-                control = segment.control
-                point = segment.end
-                self.generator.bezier_to(control1.x, control1.y,
-                                         control2.x, control2.y,
-                                         point.x, point.y)
-            else:
+            handler = lookup(type(segment))
+            if handler is None:
                 print(segment.__class__)
+            else:
+                handler(self, segment)
+
+    def __parse_arc(self, segment):
+        pass
+
+    def __parse_close(self, segment):
+        self.generator.close_path()
+        if self.subpath_count > 1:
+            self.generator.path_winding_hole()
+
+    def __parse_cubic_bezier(self, segment):
+        control1 = segment.control1
+        control2 = segment.control2
+        point = segment.end
+        self.generator.bezier_to(control1.x, control1.y,
+                                 control2.x, control2.y,
+                                 point.x, point.y)
+
+    def __parse_line_segment(self, segment):
+        point = segment.end
+        self.generator.line_to(point.x, point.y)
+
+    def __parse_move(self, segment):
+        self.subpath_count += 1
+        point = segment.end
+        self.generator.move_to(point.x, point.y)
+
+    def __parse_quadratic_bezier(self, segment):
+        control = segment.control
+        point = segment.end
+        self.generator.quad_to(control.x, control.y, point.x, point.y)
 
     @element
     def __parse_polygon(self, element):
@@ -226,12 +587,9 @@ class SVGParser(object):
         self.generator.rect(element.x, element.y, element.width, element.height)
 
     def __parse_stop(self, element):
-        if not self.linear_gradients:
-            return
-
-        stop_color = svgelements.svgelements.Color(element.values['stop-color'])
-        gradient = self.linear_gradients[list(self.linear_gradients)[-1]]
-        gradient.stops[float(element.values['offset'])] = stop_color
+        if self.last_linear_gradient is not None:
+            self.last_linear_gradient.add_stop(element.values['attributes'])
+            self.paints.clear()
 
     def __check_property_changed(self, element, *property_names):
         for property_name in property_names:
@@ -243,7 +601,7 @@ class SVGParser(object):
             if property_name == 'transform' and len(expected_value) != 6:
                 continue
 
-            current_value = self.__get_current_property_value(property_name)
+            current_value = self.properties.get(property_name)
 
             if property_name == 'transform':
                 for i in range(6):
@@ -256,23 +614,23 @@ class SVGParser(object):
 
         return False
 
-    def __get_current_property_value(self, property_name):
-        for properties in reversed(self.properties):
-            if property_name in properties:
-                return properties[property_name]
-        return None
-
     def __process_property(self, element, property_name):
-        """Updates a current property with an element's property.
+        if self.stats is None:
+            self.__update_property(element, property_name)
+        else:
+            with self.stats.timer('properties'):
+                self.__update_property(element, property_name)
 
-        Returns `True` if the property did udpate.
-        """
+    def __update_property(self, element, property_name):
+        """Updates a current property with an element's property."""
         try:
             expected_value = element.properties[property_name]
         except KeyError:
             return
 
         value_changed = self.__check_property_changed(element, property_name)
+        if not value_changed and self.stats is not None:
+            self.stats.suppressed[property_name] += 1
         if isinstance(expected_value, svgelements.svgelements.Color):
             if value_changed or expected_value.opacity:
                 self.path_began = False
@@ -302,13 +660,20 @@ class SVGParser(object):
             self.generator.transform(expected_value[0], expected_value[1],
                                      expected_value[2], expected_value[3],
                                      expected_value[4], expected_value[5])
+            self.properties.set('matrix', svgelements.Matrix(expected_value) *
+                                          self.properties.get('matrix'))
 
-        self.properties[-1][property_name] = expected_value
+        self.properties.set(property_name, expected_value)
 
     def __process_properties(self, element, *property_names):
         for property_name in property_names:
             self.__process_property(element, property_name)
 
+    def __timer(self, phase):
+        if self.stats is None:
+            return contextlib.nullcontext()
+        return self.stats.timer(phase)
+
     def __restore(self, element):
         element.save_count -= 1
         self.properties.pop()
@@ -316,7 +681,7 @@ class SVGParser(object):
 
     def __save(self, element):
         element.save_count += 1
-        self.properties.append(dict())
+        self.properties.push()
         self.generator.save()
 
     def begin_element(self, element):
@@ -326,6 +691,13 @@ class SVGParser(object):
 
         if element.is_group and len(element) == 0:
             return False
+        self.__enter_element(element)
+        return True
+
+    def __enter_element(self, element):
+        element.is_culled = self.culls and element is not self.root
+        if element.is_culled:
+            self.__begin_culling(element)
 
         self.__process_properties(element, 'linecap', 'linejoin', 'miterlimit',
                                   'transform')
@@ -334,14 +706,44 @@ class SVGParser(object):
             self.__begin_path(element)
 
         self.last_element = element
-        return True
+
+    def __enter_groups(self, frames):
+        """Begins the groups of `[group, entered]` frames that weren't
+        entered yet, outermost first.
+
+        While streaming, a group is only entered once it turns out to have
+        content, which is when `begin_element()` would have entered it.
+        """
+        index = len(frames)
+        while index and not frames[index - 1][1]:
+            index -= 1
+        for frame in frames[index:]:
+            group = frame[0]
+            group.properties = self.get_properties(group)
+            group.is_path = False
+            group.is_group = True
+            group.save_count = 0
+            self.__enter_element(group)
+            frame[1] = True
 
     def end_element(self, element):
         if element.is_path:
+            if element.is_culled:
+                self.bounds[-1] = union_bounds(self.bounds[-1],
+                                               self.__get_bounds(element))
             self.__end_path(element)
 
-    def get_content(self):
-        return '\n'.join(self.stmts)
+        if element.is_culled:
+            self.__end_culling(element)
+
+    def get_binary_content(self):
+        """Returns the recorded calls encoded in the `.nvgb` format."""
+        with self.__timer('render'):
+            return nvgb.dumps(self.ops, self.canvas_width, self.canvas_height)
+
+    def get_content(self, data_table=False):
+        with self.__timer('render'):
+            return '\n'.join(self.iter_stmts(data_table))
 
     def get_properties(self, element):
         properties = dict()
@@ -356,7 +758,8 @@ class SVGParser(object):
         if 'stroke-miterlimit' in values:
             properties['miterlimit'] = values['stroke-miterlimit']
 
-        properties['transform'] = element.transform
+        if not self.bakes_transforms:
+            properties['transform'] = element.transform
 
         if isinstance(element, svgelements.Shape):
             properties['fill'] = element.fill
@@ -365,102 +768,462 @@ class SVGParser(object):
 
         return properties
 
+    def get_stats(self):
+        """Returns the `stats.Stats` of the last parse, or `None` if the
+        parser was created without `collects_stats`.
+        """
+        if self.stats is not None:
+            self.stats.count_calls(self.ops)
+        return self.stats
+
     def get_header_file_content(self, filename, nanovg_include_path,
                                 namespace='', baseclass='',
-                                builds_object=False, prototype_only=False):
+                                builds_object=False, prototype_only=False,
+                                data_table=False, min_subroutine_length=None,
+                                color_table=False):
+        output = io.StringIO()
+        self.write_header_file(output, filename, nanovg_include_path,
+                               namespace, baseclass, builds_object,
+                               prototype_only, data_table,
+                               min_subroutine_length, color_table)
+        return output.getvalue()
+
+    def get_source_file_content(self, filename, nanovg_include_path,
+                                namespace='',
+                                header_include_path=None,
+                                builds_object=False, data_table=False,
+                                min_subroutine_length=None, color_table=False):
+        output = io.StringIO()
+        self.write_source_file(output, filename, nanovg_include_path,
+                               namespace, header_include_path, builds_object,
+                               data_table, min_subroutine_length, color_table)
+        return output.getvalue()
+
+    def write_header_file(self, output, filename, nanovg_include_path,
+                          namespace='', baseclass='', builds_object=False,
+                          prototype_only=False, data_table=False,
+                          min_subroutine_length=None, color_table=False):
+        """Writes the header file content to the file object `output`.
+
+        Statements are written as they are rendered, so memory use doesn't
+        grow with the size of the drawing. If `min_subroutine_length` is
+        specified, repeated runs of at least that many path building calls
+        are written once as `static` functions, see the `subroutines`
+        module. If `color_table` is `True`, colors are written once as a
+        `static const NVGcolor` table. Neither applies to `data_table`.
+        """
+        with self.__timer('render'):
+            self.__write_header_file(output, filename, nanovg_include_path,
+                                     namespace, baseclass, builds_object,
+                                     prototype_only, data_table,
+                                     min_subroutine_length, color_table)
+
+    def __write_header_file(self, output, filename, nanovg_include_path,
+                            namespace, baseclass, builds_object,
+                            prototype_only, data_table,
+                            min_subroutine_length, color_table):
         basename = os.path.splitext(os.path.basename(filename))[0]
         guard_constant = 'SVG2NVG_%s_H_' % basename.upper()
-        title = basename.title().replace('_', '')
+        title = get_title(basename)
 
-        result = '#ifndef %s\n' % guard_constant
-        result += '#define %s\n\n' % guard_constant
+        output.write('#ifndef %s\n' % guard_constant)
+        output.write('#define %s\n\n' % guard_constant)
 
         if nanovg_include_path:
-            result += '#include "%s"\n\n' % nanovg_include_path
+            output.write('#include "%s"\n\n' % nanovg_include_path)
+
+        if data_table and not prototype_only:
+            output.write('#include <stddef.h>\n#include <stdint.h>\n\n')
 
         if namespace:
-            result += 'namespace %s {\n\n' % namespace
+            output.write('namespace %s {\n\n' % namespace)
+
+        colors = replacements = None
+        if not prototype_only and not data_table:
+            colors, replacements = self.__write_definitions(
+                output, title, min_subroutine_length, color_table)
 
         if builds_object:
             function_name = 'Draw'
             inheritance = ' : public %s' % baseclass if baseclass else ''
-            result += 'class %s%s {\n' % (title, inheritance)
-            result += ' public:\n'
-            result += '  double GetWidth() const final { return %s; }\n' % \
-                      self.canvas_width
-            result += '  double GetHeight() const final { return %s; }\n\n' % \
-                      self.canvas_height
+            output.write('class %s%s {\n' % (title, inheritance))
+            output.write(' public:\n')
+            output.write('  double GetWidth() const final { return %s; }\n' %
+                         self.canvas_width)
+            output.write('  double GetHeight() const final { return %s; }\n\n' %
+                         self.canvas_height)
         else:
             function_name = 'Render%s' % title
 
-        prototype = '  void %s(NVGcontext *%s) const final' % \
-                    (function_name, self.context)
+        prototype = '  void %s(%s) const final' % \
+                    (function_name, get_parameters(self.context, self.culls))
         if prototype_only:
-            result += '%s;\n' % prototype
+            output.write('%s;\n' % prototype)
         else:
-            result += 'static %s {\n' % prototype
-            for stmt in self.stmts:
-                result += '  %s\n' % stmt
-            result += '}\n'
+            output.write('static %s {\n' % prototype)
+            self.__write_stmts(output, data_table, colors, replacements)
+            output.write('}\n')
 
         if builds_object:
-            result += '};\n'
+            output.write('};\n')
 
-        result += '\n'
+        output.write('\n')
         if namespace:
-            result += '}  // namespace %s\n\n' % namespace
-        result += '#endif  // %s\n' % guard_constant
-        return result
-
-    def get_source_file_content(self, filename, nanovg_include_path,
-                                namespace='',
-                                header_include_path=None,
-                                builds_object=False):
-        result = ''
+            output.write('}  // namespace %s\n\n' % namespace)
+        output.write('#endif  // %s\n' % guard_constant)
+
+    def write_source_file(self, output, filename, nanovg_include_path,
+                          namespace='', header_include_path=None,
+                          builds_object=False, data_table=False,
+                          min_subroutine_length=None, color_table=False):
+        """Writes the source file content to the file object `output`, see
+        `write_header_file()`.
+        """
+        with self.__timer('render'):
+            self.__write_source_file(output, filename, nanovg_include_path,
+                                     namespace, header_include_path,
+                                     builds_object, data_table,
+                                     min_subroutine_length, color_table)
+
+    def __write_source_file(self, output, filename, nanovg_include_path,
+                            namespace, header_include_path, builds_object,
+                            data_table, min_subroutine_length, color_table):
         basename = os.path.splitext(os.path.basename(filename))[0]
         if header_include_path is None:
             header_include_path = ''
         header_name = '%s.h' % basename
         header_include_path = os.path.join(header_include_path, header_name)
-        result += '#include "%s"\n\n' % header_include_path
+        output.write('#include "%s"\n\n' % header_include_path)
 
         if nanovg_include_path:
-            result += '#include "%s"\n\n' % nanovg_include_path
+            output.write('#include "%s"\n\n' % nanovg_include_path)
+
+        if data_table:
+            output.write('#include <stddef.h>\n#include <stdint.h>\n\n')
 
         if namespace:
-            result += 'namespace %s {\n\n' % namespace
+            output.write('namespace %s {\n\n' % namespace)
+
+        title = get_title(basename)
+        colors = replacements = None
+        if not data_table:
+            colors, replacements = self.__write_definitions(
+                output, title, min_subroutine_length, color_table)
 
-        title = basename.title().replace('_', '')
-        result += 'void '
+        output.write('void ')
         if builds_object:
             function_name = 'Draw'
-            result += '%s::' % title
+            output.write('%s::' % title)
         else:
             function_name = 'Render%s' % title
-        result += '%s(NVGcontext *%s) const {\n' % (function_name, self.context)
-        for stmt in self.stmts:
-            result += '  %s\n' % stmt
-        result += '}\n\n'
+        output.write('%s(%s) const {\n' %
+                     (function_name, get_parameters(self.context, self.culls)))
+        self.__write_stmts(output, data_table, colors, replacements)
+        output.write('}\n\n')
         if namespace:
-            result += '}  // namespace %s\n' % namespace
-        return result
+            output.write('}  // namespace %s\n' % namespace)
 
-    def parse(self, source):
-        svg = svgelements.SVG.parse(source, color=None)
-        self.groups.clear()
+    def write_content(self, output, data_table=False):
+        """Writes the statements without any surrounding code to the file
+        object `output`, one per line.
+        """
+        with self.__timer('render'):
+            for stmt in self.iter_stmts(data_table):
+                output.write(stmt)
+                output.write('\n')
+
+    def __write_definitions(self, output, title, min_subroutine_length,
+                            color_table):
+        """Writes the color table and the functions of repeated path
+        geometry, if enabled. Their names start with `title`, so several
+        drawings can be included in a single translation unit.
+
+        Returns the `colors` and `replacements` arguments of `iter_stmts()`
+        that refer to them.
+        """
+        colors = replacements = None
+        if color_table:
+            name = 'k%sColors' % title
+            colors = oplist.get_color_table([self.ops], name)
+            if colors:
+                output.write('%s\n\n' % oplist.format_color_table(colors,
+                                                                    name))
+        if min_subroutine_length is not None:
+            shared_runs = subroutines.Subroutines(
+                self.context, min_subroutine_length, title)
+            shared_runs.add(self.ops)
+            replacements = shared_runs.get_replacements()[0]
+            shared_runs.write_functions(output)
+        return colors, replacements
+
+    def __write_stmts(self, output, data_table, colors=None,
+                      replacements=None):
+        for stmt in self.iter_stmts(data_table, colors, replacements):
+            output.write('  ')
+            output.write(stmt)
+            output.write('\n')
+
+    def iter_stmts(self, data_table=False, colors=None, replacements=None):
+        """Lazily renders the recorded calls into C statements.
+
+        If `data_table` is `True`, the calls are rendered as static opcode and
+        operand arrays replayed by a dispatch loop instead. Otherwise
+        `colors` and `replacements` are passed to `oplist.iter_stmts()`.
+        """
+        if data_table:
+            return datatable.iter_stmts(self.ops, self.context)
+        return oplist.iter_stmts(self.ops, self.context, colors,
+                                 replacements)
+
+    def optimize(self):
+        """Removes redundant NanoVG calls from the recorded statements.
+
+        Returns the number of removed calls.
+        """
+        with self.__timer('optimize'):
+            self.ops, count = optimizer.optimize(self.ops)
+        if self.stats is not None:
+            self.stats.removed['optimize'] += count
+        return count
+
+    def simplify(self, tolerance):
+        """Simplifies the recorded path geometry within `tolerance`, see the
+        `simplify` module. Culling bounds are widened by `tolerance`.
+
+        Returns the number of removed calls.
+        """
+        with self.__timer('simplify'):
+            self.ops, count = simplify.simplify(self.ops, tolerance)
+            if self.culls and tolerance > 0:
+                oplist.widen_cull_bounds(self.ops, tolerance)
+        if self.stats is not None:
+            self.stats.removed['simplify'] += count
+        return count
+
+    def quantize(self, decimals=None, grid=None):
+        """Rounds the recorded coordinates, see `oplist.quantize()`.
+        Culling bounds are widened by the maximum error.
+
+        Returns the maximum error introduced to a single coordinate.
+        """
+        with self.__timer('quantize'):
+            max_error = oplist.quantize(self.ops, decimals, grid)
+            if self.culls and max_error:
+                oplist.widen_cull_bounds(self.ops, max_error)
+        return max_error
+
+    @classmethod
+    def register_element_handler(cls, element_class, handler):
+        """Makes `handler(parser, element)` parse elements of
+        `element_class`, including subclasses without a handler of their own.
+
+        Wrap handlers that draw with the `element` decorator. Registering on a
+        subclass of `SVGParser` doesn't affect its base classes.
+        """
+        if 'element_handlers' not in cls.__dict__:
+            cls.element_handlers = cls.element_handlers.copy()
+        cls.element_handlers.register(element_class, handler)
+
+    @classmethod
+    def register_segment_handler(cls, segment_class, handler):
+        """Makes `handler(parser, segment)` parse path segments of
+        `segment_class`, see `register_element_handler()`.
+        """
+        if 'segment_handlers' not in cls.__dict__:
+            cls.segment_handlers = cls.segment_handlers.copy()
+        cls.segment_handlers.register(segment_class, handler)
+
+    def __parse_source(self, source):
+        """Parses a filename or file object with svgelements and reads the
+        gradients it defines.
+        """
+        if hasattr(source, 'read'):
+            data = source.read()
+        else:
+            with open(source, 'rb') as source_file:
+                data = source_file.read()
+
+        if isinstance(data, str):
+            svg = svgelements.SVG.parse(io.StringIO(data), color=None)
+            has_gradients = 'linearGradient' in data
+            data = data.encode('utf-8')
+        else:
+            svg = svgelements.SVG.parse(io.BytesIO(data), color=None)
+            has_gradients = b'linearGradient' in data
+
+        if has_gradients:
+            self.linear_gradients.update(
+                gradients.read_linear_gradients(io.BytesIO(data)))
+            if self.stats is not None:
+                self.stats.elements['linearGradient'] += \
+                    len(self.linear_gradients)
+        return svg
+
+    def __reset(self):
+        self.stats = stats.Stats() if self.collects_stats else None
         self.linear_gradients.clear()
-        self.properties.clear()
-        self.properties.append(dict(transform=[1, 0, 0, 1, 0, 0]))
+        self.last_linear_gradient = None
+        self.paint_references.clear()
+        self.paints.clear()
+
+    def __begin_walk(self, svg):
+        self.groups.clear()
+        self.ops.clear()
+        self.properties.clear(dict(transform=[1, 0, 0, 1, 0, 0],
+                                   matrix=svgelements.Matrix()))
+        self.bounds.clear()
+        self.root = svg
         self.canvas_width = svg.width
         self.canvas_height = svg.height
-        self.generator = generator.Generator(self.stmts, self.context)
+        self.generator = generator.Generator(self.ops, self.context)
         self.last_element = None
 
-        self.__parse_group(svg)
-
+    def __end_walk(self):
         if self.path_began:
             element = self.last_element
             if element.fill.opacity:
                 self.generator.fill()
             if element.stroke.opacity:
                 self.generator.stroke()
+
+    def parse(self, source, jobs=1):
+        """Records the calls that draw `source`.
+
+        `source` is a filename, a file object or an already parsed
+        `svgelements.SVG`. With `jobs` greater than 1, the children of the
+        root element are walked in that many worker processes, with the same
+        result. This needs the `fork` start method and a filename or file
+        object, as gradients must be known before walking, otherwise the
+        walk is sequential.
+        """
+        self.__reset()
+        if isinstance(source, svgelements.SVG):
+            svg = source
+            self.jobs = 1
+        else:
+            with self.__timer('parse'):
+                svg = self.__parse_source(source)
+            self.jobs = jobs
+        self.__begin_walk(svg)
+
+        with self.__timer('walk'):
+            self.__parse_group(svg)
+            self.__end_walk()
+
+    def parse_stream(self, source):
+        """Records the calls that draw `source` like `parse()`, but reads the
+        document incrementally.
+
+        Every element is drawn and released as soon as it is read, so only
+        its ancestors and the gradient definitions stay in memory, see
+        `stream.iter_elements()`. `source` is a filename or a seekable file
+        object, which is read twice: once for the gradients, which may be
+        defined after their use, and once for drawing. The `parse` phase of
+        the stats only covers the first pass.
+        """
+        self.__reset()
+        with self.__timer('parse'):
+            if hasattr(source, 'read'):
+                position = source.tell()
+                linear_gradients = gradients.read_linear_gradients(source)
+                source.seek(position)
+            else:
+                linear_gradients = gradients.read_linear_gradients(source)
+            self.linear_gradients.update(linear_gradients)
+            if self.stats is not None and linear_gradients:
+                self.stats.elements['linearGradient'] += \
+                    len(linear_gradients)
+
+        # [group, entered] pairs of the open groups.
+        frames = list()
+        hidden_depth = 0
+        with self.__timer('walk'):
+            for event, element in stream.iter_elements(source, color=None):
+                if event == stream.END:
+                    if hidden_depth:
+                        hidden_depth -= 1
+                        continue
+                    group, entered = frames.pop()
+                    if entered:
+                        while group.save_count > 0:
+                            self.__restore(group)
+                        self.end_element(group)
+                    continue
+                if hidden_depth:
+                    if event == stream.BEGIN:
+                        hidden_depth += 1
+                    continue
+
+                if not frames:
+                    if event != stream.BEGIN or \
+                       not isinstance(element, svgelements.SVG):
+                        raise ValueError('The document root is not <svg>')
+                    self.__begin_walk(element)
+                else:
+                    # Hidden elements still make their parents non-empty.
+                    self.__enter_groups(frames)
+                    if element.values.get('visibility') == 'hidden':
+                        if event == stream.BEGIN:
+                            hidden_depth += 1
+                        continue
+
+                if event == stream.BEGIN:
+                    if self.stats is not None:
+                        self.stats.elements[element.values.get(
+                            'tag', 'unknown')] += 1
+                    frames.append([element, False])
+                    continue
+
+                if self.bakes_transforms and \
+                   isinstance(element, svgelements.Shape) and \
+                   not element.transform.is_identity():
+                    element = self.__bake_transform(element)
+                handler = self.element_handlers.lookup(type(element))
+                if handler is not None:
+                    handler(self, element)
+            self.__end_walk()
+
+    def walk_elements(self, elements, values, path_began):
+        """Records the calls that draw `elements`, children of the root,
+        into a new `OpList`, starting from the effective property `values`
+        and `path_began` left behind by their preceding siblings.
+
+        Returns a `WalkResult`. This is the work done by a worker process of
+        a parallel `parse()`, it replaces the state of the walk.
+        """
+        start_key = get_state_key(values, path_began)
+        self.ops = oplist.OpList()
+        self.generator = generator.Generator(self.ops, self.context)
+        self.properties = state.PropertyStack(values)
+        self.properties.push()
+        self.path_began = path_began
+        self.bounds = list()
+        self.last_element = None
+        self.stats = stats.Stats() if self.collects_stats else None
+
+        self.__parse_children(elements)
+        return WalkResult(start_key, self.ops, self.properties.get_changes(),
+                          self.path_began,
+                          self.last_element if self.path_began else None,
+                          self.stats)
+
+    element_handlers = HandlerRegistry({
+        svgelements.Circle: __parse_circle,
+        svgelements.Ellipse: __parse_ellipse,
+        svgelements.Group: __parse_group,
+        svgelements.Path: __parse_path,
+        svgelements.Polygon: __parse_polygon,
+        svgelements.Polyline: __parse_polyline,
+        svgelements.Rect: __parse_rect,
+        svgelements.SimpleLine: __parse_line,
+        svgelements.SVGElement: __parse_other_element,
+    })
+
+    segment_handlers = HandlerRegistry({
+        svgelements.Arc: __parse_arc,
+        svgelements.Close: __parse_close,
+        svgelements.CubicBezier: __parse_cubic_bezier,
+        svgelements.Line: __parse_line_segment,
+        svgelements.Move: __parse_move,
+        svgelements.QuadraticBezier: __parse_quadratic_bezier,
+    })
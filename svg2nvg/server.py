@@ -0,0 +1,158 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A conversion server that keeps svg2nvg and its imports warm.
+
+Clients connect to a Unix domain socket and send one JSON object per line:
+
+    {"argv": ["icon.svg", "--source_file"], "cwd": "/path/to/build"}
+
+`argv` holds the command line arguments of `svg2nvg` and `cwd` the directory
+relative paths are resolved against. Each request is answered with one line:
+
+    {"status": 0, "stdout": "...", "stderr": "..."}
+
+Requests are run by a pool of worker processes, so parallel build jobs are
+converted concurrently. See `svg2nvg.client` for the client.
+"""
+
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+
+from svg2nvg import command
+# Imported up front so workers fork with svgelements loaded.
+import svg2nvg.parser
+
+
+def run_command(argv, cwd=None):
+    """Runs a command line in this process and returns a response dict with
+    the exit status and the captured output.
+    """
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    previous_cwd = os.getcwd()
+    status = 0
+    try:
+        with contextlib.redirect_stdout(stdout), \
+             contextlib.redirect_stderr(stderr):
+            try:
+                if cwd:
+                    os.chdir(cwd)
+                if not argv:
+                    command.parser.print_help()
+                else:
+                    args = command.parser.parse_args(argv)
+                    if args.watch or args.serve:
+                        command.parser.error('--watch and --serve are not '
+                                             'supported by the server')
+                    # The server's workers already run in parallel.
+                    args.jobs = 1
+                    command.execute(args)
+            except SystemExit as exit:
+                if isinstance(exit.code, str):
+                    print(exit.code, file=sys.stderr)
+                    status = 1
+                else:
+                    status = exit.code or 0
+            except Exception as error:
+                print(' !! %s: %s' % (error.__class__.__name__, error),
+                      file=sys.stderr)
+                status = 1
+    finally:
+        os.chdir(previous_cwd)
+    return dict(status=status, stdout=stdout.getvalue(),
+                stderr=stderr.getvalue())
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                future = self.server.executor.submit(
+                    run_command, list(request['argv']), request.get('cwd'))
+                response = future.result()
+            except Exception as error:
+                response = dict(status=1, stdout='',
+                                stderr=' !! Invalid request: %s: %s\n' %
+                                       (error.__class__.__name__, error))
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, jobs=0):
+        jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+        # Workers are started before any request thread exists, so they
+        # fork from a single-threaded process with svg2nvg already imported.
+        # Interrupts are left to the server process, which shuts them down.
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=signal.signal,
+            initargs=(signal.SIGINT, signal.SIG_IGN))
+        self.executor.submit(os.getpid).result()
+        self.jobs = jobs
+        socketserver.UnixStreamServer.__init__(self, socket_path,
+                                               RequestHandler)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self.executor.shutdown()
+
+
+def is_listening(socket_path):
+    """Returns `True` if a server accepts connections at `socket_path`."""
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        return False
+    finally:
+        connection.close()
+    return True
+
+def serve(socket_path, jobs=0):
+    """Serves conversion requests at `socket_path` until interrupted or
+    terminated.
+    """
+    if os.path.exists(socket_path):
+        if is_listening(socket_path):
+            print(' !! A server is already listening at %s' % socket_path,
+                  file=sys.stderr)
+            sys.exit(1)
+        # Left behind by a server that didn't shut down cleanly.
+        os.unlink(socket_path)
+
+    server = Server(socket_path, jobs)
+    # Build systems usually stop daemons with SIGTERM.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('Serving at %s with %d workers, press Ctrl-C to stop' %
+          (socket_path, server.jobs), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
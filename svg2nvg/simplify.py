@@ -0,0 +1,407 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tolerance-based simplification of recorded path geometry.
+
+Every run of consecutive `nvgLineTo()` calls, together with the point it
+starts from, is treated as a polyline:
+
+1. Ramer-Douglas-Peucker drops every point that lies within the tolerance of
+   the simplified polyline, which removes collinear and near-duplicate points
+   and merges consecutive line segments.
+2. The polyline is split at its corners and every span in between is refit
+   with cubic Beziers (Schneider's algorithm). The curves replace the lines
+   whenever they need fewer operands.
+
+The start and end points of every run are kept exactly, so subpaths stay
+connected and closed. NumPy is used to vectorize the per-point work when it is
+installed.
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from svg2nvg import oplist
+
+
+# The minimum turning angle, in radians, at which a polyline vertex is kept as
+# a sharp corner instead of being smoothed by a curve.
+CORNER_ANGLE = math.radians(45)
+
+# The minimum number of line segments a span must have to be refit.
+FIT_MIN_SEGMENTS = 4
+
+# The maximum number of Newton-Raphson reparameterizations per curve.
+MAX_REPARAMETERIZATIONS = 4
+
+
+def _normalize(x, y):
+    length = math.hypot(x, y)
+    if not length:
+        return 0.0, 0.0
+    return x / length, y / length
+
+def _farthest_point(xs, ys, first, last):
+    """Returns the index and distance of the point between `first` and `last`
+    that is farthest from the segment connecting both.
+    """
+    x1, y1 = xs[first], ys[first]
+    dx, dy = xs[last] - x1, ys[last] - y1
+    length_sq = dx * dx + dy * dy
+
+    if numpy is not None:
+        px = xs[first + 1:last] - x1
+        py = ys[first + 1:last] - y1
+        if length_sq:
+            t = numpy.clip((px * dx + py * dy) / length_sq, 0, 1)
+            px = px - t * dx
+            py = py - t * dy
+        distances = px * px + py * py
+        index = int(numpy.argmax(distances))
+        return first + 1 + index, math.sqrt(distances[index])
+
+    max_distance_sq = -1
+    index = first + 1
+    for i in range(first + 1, last):
+        px = xs[i] - x1
+        py = ys[i] - y1
+        if length_sq:
+            t = min(max((px * dx + py * dy) / length_sq, 0), 1)
+            px -= t * dx
+            py -= t * dy
+        distance_sq = px * px + py * py
+        if distance_sq > max_distance_sq:
+            max_distance_sq = distance_sq
+            index = i
+    return index, math.sqrt(max_distance_sq)
+
+def simplify_polyline(xs, ys, tolerance):
+    """Returns the sorted indices of the points kept by Ramer-Douglas-Peucker.
+    """
+    last = len(xs) - 1
+    keep = [0, last]
+    stack = [(0, last)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        index, distance = _farthest_point(xs, ys, first, last)
+        if distance > tolerance:
+            keep.append(index)
+            stack.append((first, index))
+            stack.append((index, last))
+    keep.sort()
+    return keep
+
+def find_corners(xs, ys, indices):
+    """Returns the kept vertices where the polyline turns sharply."""
+    corners = [indices[0]]
+    for previous, current, following in zip(indices, indices[1:],
+                                            indices[2:]):
+        ax, ay = _normalize(xs[current] - xs[previous],
+                            ys[current] - ys[previous])
+        bx, by = _normalize(xs[following] - xs[current],
+                            ys[following] - ys[current])
+        angle = math.atan2(ax * by - ay * bx, ax * bx + ay * by)
+        if abs(angle) > CORNER_ANGLE:
+            corners.append(current)
+    corners.append(indices[-1])
+    return corners
+
+
+class _CurveFitter(object):
+    """Fits cubic Beziers to a span of points within an error bound."""
+
+    def __init__(self, xs, ys, tolerance):
+        self.xs = xs
+        self.ys = ys
+        self.error_sq = tolerance * tolerance
+
+    def __bezier(self, curve, u):
+        """Evaluates a curve and its first two derivatives at `u`."""
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = curve
+        v = 1 - u
+        b0, b1, b2, b3 = v * v * v, 3 * u * v * v, 3 * u * u * v, u * u * u
+        qx = b0 * x0 + b1 * x1 + b2 * x2 + b3 * x3
+        qy = b0 * y0 + b1 * y1 + b2 * y2 + b3 * y3
+        d0, d1, d2 = 3 * v * v, 6 * u * v, 3 * u * u
+        dx = d0 * (x1 - x0) + d1 * (x2 - x1) + d2 * (x3 - x2)
+        dy = d0 * (y1 - y0) + d1 * (y2 - y1) + d2 * (y3 - y2)
+        ddx = 6 * v * (x2 - 2 * x1 + x0) + 6 * u * (x3 - 2 * x2 + x1)
+        ddy = 6 * v * (y2 - 2 * y1 + y0) + 6 * u * (y3 - 2 * y2 + y1)
+        return qx, qy, dx, dy, ddx, ddy
+
+    def __chord_parameters(self, first, last):
+        xs, ys = self.xs, self.ys
+        if numpy is not None:
+            dx = numpy.diff(xs[first:last + 1])
+            dy = numpy.diff(ys[first:last + 1])
+            lengths = numpy.sqrt(dx * dx + dy * dy)
+            u = numpy.concatenate(([0.0], numpy.cumsum(lengths)))
+            return u / u[-1]
+
+        # Unlike `math.hypot()`, the square root of the sum gives the same
+        # results with and without NumPy.
+        u = [0.0]
+        for i in range(first + 1, last + 1):
+            dx = xs[i] - xs[i - 1]
+            dy = ys[i] - ys[i - 1]
+            u.append(u[-1] + math.sqrt(dx * dx + dy * dy))
+        return [value / u[-1] for value in u]
+
+    def __generate(self, first, last, u, tan1, tan2):
+        """Least-squares fits the inner control points for parameters `u`."""
+        xs, ys = self.xs, self.ys
+        x0, y0, x3, y3 = xs[first], ys[first], xs[last], ys[last]
+        if numpy is not None:
+            px, py = xs[first:last + 1], ys[first:last + 1]
+            v = 1 - u
+            b0, b1, b2, b3 = v * v * v, 3 * u * v * v, 3 * u * u * v, u * u * u
+            a1x, a1y = tan1[0] * b1, tan1[1] * b1
+            a2x, a2y = tan2[0] * b2, tan2[1] * b2
+            tx = px - x0 * (b0 + b1) - x3 * (b2 + b3)
+            ty = py - y0 * (b0 + b1) - y3 * (b2 + b3)
+            # Sums in order like the loop below, unlike `numpy.sum()`.
+            c00 = float(numpy.cumsum(a1x * a1x + a1y * a1y)[-1])
+            c01 = float(numpy.cumsum(a1x * a2x + a1y * a2y)[-1])
+            c11 = float(numpy.cumsum(a2x * a2x + a2y * a2y)[-1])
+            x0_ = float(numpy.cumsum(a1x * tx + a1y * ty)[-1])
+            x1_ = float(numpy.cumsum(a2x * tx + a2y * ty)[-1])
+        else:
+            c00 = c01 = c11 = x0_ = x1_ = 0.0
+            for i, t in enumerate(u):
+                v = 1 - t
+                b0, b1, b2, b3 = v * v * v, 3 * t * v * v, 3 * t * t * v, \
+                                 t * t * t
+                a1x, a1y = tan1[0] * b1, tan1[1] * b1
+                a2x, a2y = tan2[0] * b2, tan2[1] * b2
+                tx = xs[first + i] - x0 * (b0 + b1) - x3 * (b2 + b3)
+                ty = ys[first + i] - y0 * (b0 + b1) - y3 * (b2 + b3)
+                c00 += a1x * a1x + a1y * a1y
+                c01 += a1x * a2x + a1y * a2y
+                c11 += a2x * a2x + a2y * a2y
+                x0_ += a1x * tx + a1y * ty
+                x1_ += a2x * tx + a2y * ty
+
+        segment_length = math.hypot(x3 - x0, y3 - y0)
+        det = c00 * c11 - c01 * c01
+        alpha1 = alpha2 = 0
+        if abs(det) > 1e-12:
+            alpha1 = (x0_ * c11 - x1_ * c01) / det
+            alpha2 = (c00 * x1_ - c01 * x0_) / det
+        epsilon = 1e-6 * segment_length
+        if alpha1 < epsilon or alpha2 < epsilon:
+            alpha1 = alpha2 = segment_length / 3
+
+        return ((x0, y0),
+                (x0 + tan1[0] * alpha1, y0 + tan1[1] * alpha1),
+                (x3 + tan2[0] * alpha2, y3 + tan2[1] * alpha2),
+                (x3, y3))
+
+    def __max_error(self, first, last, curve, u):
+        """Returns the largest squared distance and the index it occurs at."""
+        xs, ys = self.xs, self.ys
+        if numpy is not None:
+            qx, qy = self.__bezier(curve, u)[:2]
+            distances = (qx - xs[first:last + 1]) ** 2 + \
+                        (qy - ys[first:last + 1]) ** 2
+            index = int(numpy.argmax(distances[1:-1])) + 1
+            return float(distances[index]), first + index
+
+        # Picks the first of equal distances like `numpy.argmax()`.
+        max_distance_sq = 0
+        split = first + 1
+        for i in range(1, last - first):
+            qx, qy = self.__bezier(curve, u[i])[:2]
+            distance_sq = (qx - xs[first + i]) ** 2 + \
+                          (qy - ys[first + i]) ** 2
+            if distance_sq > max_distance_sq:
+                max_distance_sq = distance_sq
+                split = first + i
+        return max_distance_sq, split
+
+    def __reparameterize(self, first, last, curve, u):
+        """Improves `u` with a Newton-Raphson step.
+
+        Returns `None` if the parameters would no longer be in order.
+        """
+        xs, ys = self.xs, self.ys
+        if numpy is not None:
+            qx, qy, dx, dy, ddx, ddy = self.__bezier(curve, u)
+            ex = qx - xs[first:last + 1]
+            ey = qy - ys[first:last + 1]
+            numerator = ex * dx + ey * dy
+            denominator = dx * dx + dy * dy + ex * ddx + ey * ddy
+            step = numpy.divide(numerator, denominator,
+                                out=numpy.zeros_like(u),
+                                where=numpy.abs(denominator) > 1e-12)
+            u = numpy.clip(u - step, 0, 1)
+            if numpy.any(numpy.diff(u) <= 0):
+                return None
+            return u
+
+        result = list()
+        for i, t in enumerate(u):
+            qx, qy, dx, dy, ddx, ddy = self.__bezier(curve, t)
+            ex = qx - xs[first + i]
+            ey = qy - ys[first + i]
+            denominator = dx * dx + dy * dy + ex * ddx + ey * ddy
+            if abs(denominator) > 1e-12:
+                t -= (ex * dx + ey * dy) / denominator
+            t = min(max(t, 0), 1)
+            if result and t <= result[-1]:
+                return None
+            result.append(t)
+        return result
+
+    def fit(self, first, last):
+        """Returns curves as `(c1x, c1y, c2x, c2y, x, y)` tuples."""
+        xs, ys = self.xs, self.ys
+        tan1 = _normalize(xs[first + 1] - xs[first], ys[first + 1] - ys[first])
+        tan2 = _normalize(xs[last - 1] - xs[last], ys[last - 1] - ys[last])
+
+        curves = list()
+        stack = [(first, last, tan1, tan2)]
+        while stack:
+            first, last, tan1, tan2 = stack.pop()
+            if last - first == 1:
+                distance = math.hypot(xs[last] - xs[first],
+                                      ys[last] - ys[first]) / 3
+                curves.append((xs[first] + tan1[0] * distance,
+                               ys[first] + tan1[1] * distance,
+                               xs[last] + tan2[0] * distance,
+                               ys[last] + tan2[1] * distance,
+                               xs[last], ys[last]))
+                continue
+
+            u = self.__chord_parameters(first, last)
+            curve = self.__generate(first, last, u, tan1, tan2)
+            error_sq, split = self.__max_error(first, last, curve, u)
+            for i in range(MAX_REPARAMETERIZATIONS):
+                if error_sq <= self.error_sq:
+                    break
+                u = self.__reparameterize(first, last, curve, u)
+                if u is None:
+                    break
+                curve = self.__generate(first, last, u, tan1, tan2)
+                error_sq, split = self.__max_error(first, last, curve, u)
+
+            if error_sq <= self.error_sq:
+                curves.append(curve[1] + curve[2] + curve[3])
+                continue
+
+            center = _normalize(xs[split - 1] - xs[split + 1],
+                                ys[split - 1] - ys[split + 1])
+            if center == (0.0, 0.0):
+                center = _normalize(ys[split] - ys[split - 1],
+                                    xs[split - 1] - xs[split])
+            # The first half is fit last so curves come out in order.
+            stack.append((split, last, (-center[0], -center[1]), tan2))
+            stack.append((first, split, tan1, center))
+        return curves
+
+
+def simplify_run(points, tolerance):
+    """Simplifies a polyline given as a list of `(x, y)` tuples.
+
+    The first point is the current point the run starts from. Returns a list
+    of `(opcode, operands)` tuples that continue from the first point.
+    """
+    # Drops exact duplicates which carry no geometry and break the chord
+    # length parameterization of the curve fitter.
+    unique = [points[0]]
+    for point in points[1:]:
+        if point != unique[-1]:
+            unique.append(point)
+    if len(unique) < 2:
+        return [(oplist.LINE_TO, points[-1])]
+
+    xs = [point[0] for point in unique]
+    ys = [point[1] for point in unique]
+    if numpy is not None:
+        xs = numpy.array(xs)
+        ys = numpy.array(ys)
+
+    indices = simplify_polyline(xs, ys, tolerance)
+    corners = find_corners(xs, ys, indices)
+    fitter = _CurveFitter(xs, ys, tolerance)
+    result = list()
+    position = 0
+    for start, end in zip(corners, corners[1:]):
+        lines = list()
+        while indices[position] < end:
+            position += 1
+            index = indices[position]
+            lines.append((oplist.LINE_TO, (float(xs[index]),
+                                           float(ys[index]))))
+
+        if len(lines) >= FIT_MIN_SEGMENTS:
+            curves = fitter.fit(start, end)
+            if len(curves) * oplist.ARITIES[oplist.BEZIER_TO] < \
+               len(lines) * oplist.ARITIES[oplist.LINE_TO]:
+                lines = [(oplist.BEZIER_TO, tuple(float(value)
+                                                  for value in curve))
+                         for curve in curves]
+        result.extend(lines)
+    return result
+
+def simplify(ops, tolerance):
+    """Returns a simplified copy of an `OpList` and the number of removed
+    calls.
+    """
+    result = oplist.OpList()
+    if tolerance <= 0:
+        result.extend(ops)
+        return result, 0
+
+    run = list()
+    current_point = None
+
+    def flush():
+        if len(run) > 2:
+            for code, args in simplify_run(run, tolerance):
+                result.append(code, *args)
+        else:
+            for point in run[1:]:
+                result.append(oplist.LINE_TO, *point)
+        del run[:]
+
+    for code, args in ops:
+        if code == oplist.LINE_TO:
+            if not run:
+                if current_point is None:
+                    result.append(code, *args)
+                    current_point = args
+                    continue
+                run.append(current_point)
+            run.append(args)
+            current_point = args
+            continue
+
+        if run:
+            flush()
+        result.append(code, *args)
+        if code in (oplist.MOVE_TO, oplist.BEZIER_TO, oplist.QUAD_TO):
+            current_point = args[-2:]
+        else:
+            # Any other call either starts a new subpath or may change the
+            # transform applied to the following points.
+            current_point = None
+    if run:
+        flush()
+    return result, len(ops) - len(result)
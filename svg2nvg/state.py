@@ -0,0 +1,83 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Scoped drawing state."""
+
+
+# Marks properties that were unset before a scope assigned them.
+_UNSET = object()
+
+
+class PropertyStack(object):
+    """The effective values of properties with nested scopes, mirroring
+    `nvgSave()` and `nvgRestore()`.
+
+    Effective values are kept in a single dict so lookups don't depend on the
+    nesting depth. Each scope keeps an undo log of the values it replaced,
+    which `pop()` puts back.
+    """
+
+    def __init__(self, values=None):
+        self.values = dict(values or ())
+        self.undo_logs = list()
+
+    def __len__(self):
+        """Returns the number of pushed scopes."""
+        return len(self.undo_logs)
+
+    def clear(self, values=None):
+        """Drops all scopes and resets the effective values."""
+        self.values = dict(values or ())
+        self.undo_logs.clear()
+
+    def get_changes(self):
+        """Returns the effective values of the properties set in the current
+        scope.
+        """
+        return dict((name, self.values[name]) for name in self.undo_logs[-1])
+
+    def get(self, name):
+        """Returns the effective value of a property or `None` if unset."""
+        return self.values.get(name)
+
+    def pop(self):
+        for name, value in self.undo_logs.pop().items():
+            if value is _UNSET:
+                del self.values[name]
+            else:
+                self.values[name] = value
+
+    def push(self):
+        self.undo_logs.append(dict())
+
+    def set(self, name, value):
+        """Sets the effective value of a property in the current scope."""
+        if self.undo_logs:
+            undo_log = self.undo_logs[-1]
+            if name not in undo_log:
+                undo_log[name] = self.values.get(name, _UNSET)
+        self.values[name] = value
+
+    def update(self, values):
+        """Sets the effective values of several properties in the current
+        scope.
+        """
+        for name, value in values.items():
+            self.set(name, value)
+
+    def snapshot(self):
+        """Returns a copy of the effective values, which can be passed to
+        `PropertyStack()` to continue from the same state.
+        """
+        return dict(self.values)
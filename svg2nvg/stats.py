@@ -0,0 +1,107 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Phase timings and counters of a single conversion.
+
+The phases are:
+
+* `parse`: reading the document with svgelements.
+* `walk`: traversing the element tree and recording calls. This includes
+  `properties`.
+* `properties`: comparing and applying element properties.
+* `simplify`, `quantize` and `optimize`: the optional post-processing passes.
+* `render`: generating the output content.
+"""
+
+import collections
+import contextlib
+import json
+import time
+
+from svg2nvg import oplist
+
+
+PHASES = ('parse', 'walk', 'properties', 'simplify', 'quantize', 'optimize',
+          'render')
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.timings = dict()
+        # Parsed elements by tag name.
+        self.elements = collections.Counter()
+        # Recorded calls by NanoVG function name.
+        self.calls = collections.Counter()
+        # Property changes that were not emitted because the value was
+        # already current, by property name.
+        self.suppressed = collections.Counter()
+        # Calls removed by the post-processing passes, by phase.
+        self.removed = collections.Counter()
+
+    def add_time(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0) + seconds
+
+    def merge(self, other):
+        """Adds the timings and counters of another `Stats`."""
+        for phase, seconds in other.timings.items():
+            self.add_time(phase, seconds)
+        self.elements.update(other.elements)
+        self.calls.update(other.calls)
+        self.suppressed.update(other.suppressed)
+        self.removed.update(other.removed)
+
+    def count_calls(self, ops):
+        """Recounts the calls recorded in an `OpList`."""
+        self.calls.clear()
+        for code in ops.codes:
+            name = oplist.OPCODES[code][0]
+            if code not in (oplist.CULL_BEGIN, oplist.CULL_END):
+                name = 'nvg%s' % name
+            self.calls[name] += 1
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start_time)
+
+    def format(self):
+        """Returns a human-readable report."""
+        lines = ['Phases:']
+        for phase in PHASES:
+            if phase in self.timings:
+                lines.append('  %-12s %10.4fs' % (phase, self.timings[phase]))
+        for title, counter in (('Elements', self.elements),
+                               ('Calls', self.calls),
+                               ('Suppressed state changes', self.suppressed),
+                               ('Removed calls', self.removed)):
+            lines.append('%s: %d' % (title, sum(counter.values())))
+            for name, count in sorted(counter.items()):
+                lines.append('  %-24s %8d' % (name, count))
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return dict(
+            timings=dict((phase, self.timings[phase]) for phase in PHASES
+                         if phase in self.timings),
+            elements=dict(self.elements),
+            calls=dict(self.calls),
+            suppressed=dict(self.suppressed),
+            removed=dict(self.removed))
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
@@ -0,0 +1,260 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Incremental reading of SVG documents.
+
+`svgelements.SVG.parse()` keeps the whole XML tree and every element it
+builds in memory. `iter_elements()` builds the same svgelements objects with
+the same inherited values, but yields each one as soon as it is complete and
+drops the XML nodes it has read, so memory only grows with nesting depth.
+
+The following are not supported, as svg2nvg doesn't draw them anyway:
+
+* `<use>` elements are yielded but their references aren't expanded.
+* Clip paths aren't linked to the elements using them.
+* A nested `<svg>` element of zero size ends the document, whereas
+  svgelements returns that element instead of the document.
+"""
+
+import re
+import xml.etree.ElementTree
+
+import svgelements
+
+
+# Events yielded by `iter_elements()`.
+BEGIN = 'begin'
+END = 'end'
+ELEMENT = 'element'
+
+SVG_NAMESPACE = '{http://www.w3.org/2000/svg}'
+
+SHAPE_CLASSES = {
+    'circle': svgelements.Circle,
+    'ellipse': svgelements.Ellipse,
+    'image': svgelements.Image,
+    'line': svgelements.SimpleLine,
+    'path': svgelements.Path,
+    'polygon': svgelements.Polygon,
+    'polyline': svgelements.Polyline,
+    'rect': svgelements.Rect,
+}
+
+# Containers whose content is never drawn.
+NON_RENDERED_TAGS = frozenset(['clipPath', 'defs', 'pattern', 'use'])
+
+# Elements that are complete once their text is read.
+TEXT_TAGS = frozenset(['desc', 'style', 'text', 'title', 'tspan'])
+
+NON_PROPAGATING_ATTRIBUTES = ('preserveAspectRatio', 'viewBox', 'id', 'class',
+                              'clip-path')
+
+
+def get_style(styles, tag, attributes):
+    """Returns the declarations of `<style>` rules matching an element,
+    followed by its own `style` attribute.
+    """
+    declarations = [styles.get('*', '') + styles.get(tag, '')]
+    if 'id' in attributes:
+        declarations.append(styles.get('#%s' % attributes['id'], ''))
+    if 'class' in attributes:
+        for name in attributes['class'].split(' '):
+            declarations.append(styles.get('.%s' % name, ''))
+            declarations.append(styles.get('%s.%s' % (tag, name), ''))
+    declarations.append(attributes.get('style', ''))
+    return ';'.join(declarations)
+
+def add_style_rules(styles, text):
+    """Adds the rules of a `<style>` element to `styles`."""
+    text = re.sub(svgelements.REGEX_CSS_COMMENT, '', text or '')
+    for selectors, declarations in re.findall(svgelements.REGEX_CSS_STYLE,
+                                              text.strip()):
+        declarations = declarations.strip()
+        for selector in selectors.strip().split(','):
+            selector = selector.strip()
+            if selector not in styles:
+                styles[selector] = declarations
+            else:
+                if not styles[selector].endswith(';'):
+                    styles[selector] += ';'
+                styles[selector] += declarations
+
+def get_values(values, tag, node, styles):
+    """Returns the values of an element, given the values of its parent."""
+    values = dict(values)
+    for name in NON_PROPAGATING_ATTRIBUTES:
+        values.pop(name, None)
+
+    attributes = dict(node.attrib)
+    attributes['tag'] = tag
+    for declaration in get_style(styles, tag, attributes).split(';'):
+        parts = declaration.split(':')
+        if len(parts) == 2:
+            attributes[parts[0].strip()] = parts[1].strip()
+
+    for name in ('fill', 'stroke'):
+        if attributes.get(name) == 'currentColor':
+            attributes[name] = attributes.get('color', values['color'])
+    if 'transform' in attributes and 'transform' in values:
+        attributes['transform'] = '%s %s' % (values['transform'],
+                                             attributes['transform'])
+
+    values.update(attributes)
+    values['attributes'] = attributes
+    return values
+
+def is_displayed(values):
+    return values.get('display', '').lower() != 'none'
+
+def build_shape(tag, values, ppi, width, height):
+    """Returns the shape of an element or `None` if it draws nothing."""
+    shape = None
+    try:
+        if tag == 'path':
+            shape = svgelements.Path(values, pathd_loaded=True)
+            shape.parse(values.get('d'))
+        else:
+            shape = SHAPE_CLASSES[tag](values)
+    except ValueError:
+        # Like svgelements, keeps what was read of a partially valid path.
+        if shape is None:
+            return None
+    shape.render(ppi=ppi, width=width, height=height)
+    shape.reify()
+    return None if shape.is_degenerate() else shape
+
+def iter_elements(source, ppi=svgelements.DEFAULT_PPI, color='black'):
+    """Yields the elements of an SVG document as `(event, element)` tuples.
+
+    `svgelements.Group` and `svgelements.SVG` elements are yielded by a
+    `BEGIN` event before and an `END` event after their content, all other
+    drawn elements by an `ELEMENT` event. Elements are yielded in the order
+    `svgelements.SVG.parse()` adds them to their parents. `source` is a
+    filename or a file object.
+    """
+    styles = dict()
+    width = height = None
+    values = dict(color=color, fill='black', stroke='none')
+    # (values, rendered, group) tuples of open elements, where `values` and
+    # `rendered` are those of the parent.
+    stack = list()
+    rendered = True
+    hidden_depth = 0
+    nodes = list()
+
+    for event, node in xml.etree.ElementTree.iterparse(
+            source, events=('start', 'end', 'start-ns')):
+        if event == 'start-ns':
+            if not hidden_depth and node[0] != 'd':
+                values[node[0]] = node[1]
+            continue
+
+        tag = node.tag
+        if tag.startswith(SVG_NAMESPACE):
+            tag = tag[len(SVG_NAMESPACE):]
+
+        if event == 'end':
+            nodes.pop()
+            if hidden_depth:
+                hidden_depth -= 1
+            else:
+                if tag == 'style':
+                    add_style_rules(styles, node.text)
+                elif rendered and tag in ('text', 'tspan'):
+                    text = svgelements.Text(values, text=node.text)
+                    text.render(ppi=ppi, width=width, height=height)
+                    text.reify()
+                    yield ELEMENT, text
+                elif rendered and tag == 'desc':
+                    yield ELEMENT, svgelements.Desc(values, desc=node.text)
+                elif rendered and tag == 'title':
+                    yield ELEMENT, svgelements.Title(values, title=node.text)
+                values, parent_rendered, group = stack.pop()
+                if group is not None:
+                    yield END, group
+                rendered = parent_rendered
+            # Only the ancestors of the next element stay in memory.
+            node.clear()
+            if nodes:
+                del nodes[-1][:]
+            continue
+
+        nodes.append(node)
+        if hidden_depth or not is_displayed(values):
+            hidden_depth += 1
+            continue
+        element_values = get_values(values, tag, node, styles)
+        if not is_displayed(element_values):
+            hidden_depth += 1
+            continue
+
+        group = None
+        element_rendered = rendered
+        if tag == 'svg':
+            svg = svgelements.SVG(element_values)
+            if width is None:
+                width = svg.viewbox.width if svg.viewbox is not None else 1000
+            if height is None:
+                height = svg.viewbox.height if svg.viewbox is not None \
+                         else 1000
+            svg.render(ppi=ppi, width=width, height=height,
+                       viewbox=svg.viewbox)
+            # Sic, svgelements swaps them.
+            height, width = svg.width, svg.height
+            if svg.viewbox is not None:
+                try:
+                    if svg.height == 0 or svg.width == 0:
+                        raise ZeroDivisionError
+                    viewport_transform = svg.viewbox_transform
+                except ZeroDivisionError:
+                    # A zero size disables rendering, svgelements stops
+                    # parsing the document.
+                    if not stack:
+                        yield BEGIN, svg
+                        yield END, svg
+                    for parent_values, parent_rendered, parent_group in \
+                            reversed(stack):
+                        if parent_group is not None:
+                            yield END, parent_group
+                    return
+                if 'transform' in element_values:
+                    element_values['transform'] += ' ' + viewport_transform
+                else:
+                    element_values['transform'] = viewport_transform
+                element_values['viewport_transform'] = \
+                    element_values['transform']
+                width, height = svg.viewbox.width, svg.viewbox.height
+            if rendered:
+                group = svg
+        elif tag == 'g':
+            if rendered:
+                group = svgelements.Group(element_values)
+                group.render(ppi=ppi, width=width, height=height)
+        elif tag in NON_RENDERED_TAGS:
+            if tag == 'use' and rendered:
+                yield ELEMENT, svgelements.Use(element_values)
+            element_rendered = False
+        elif tag in SHAPE_CLASSES:
+            if rendered:
+                shape = build_shape(tag, element_values, ppi, width, height)
+                if shape is not None:
+                    yield ELEMENT, shape
+        elif tag not in TEXT_TAGS and rendered:
+            yield ELEMENT, svgelements.SVGElement(element_values)
+
+        stack.append((values, rendered, group))
+        values = element_values
+        rendered = element_rendered
+        if group is not None:
+            yield BEGIN, group
@@ -0,0 +1,253 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Shared functions for repeated path geometry.
+
+Runs of path building calls are compared after moving them to their own
+origin, the first point of the run, so the outline of a marker placed in many
+spots matches itself. Runs that occur more than once are emitted as a single
+`static` function taking the origin as its `x` and `y` parameters, and every
+occurrence becomes a call of that function.
+
+svgelements applies transforms to the coordinates, so a copy that is also
+rotated, scaled, skewed or mirrored only matches up to an affine transform.
+The remaining runs of path segments are compared in the frame spanned by
+their first three points that aren't collinear. Runs that match this way are
+emitted as a function taking the matrix of the frame, which it applies with
+`nvgTransform()` between `nvgSave()` and `nvgRestore()`. Lengths such as
+radii don't follow an affine transform, so runs with `Circle`, `Rect` and
+similar calls only match by position.
+"""
+
+import collections
+import math
+
+from svg2nvg import oplist
+
+
+# Shorter runs are cheaper to inline than to call.
+MIN_LENGTH = 4
+
+# Coordinates relative to the origin are rounded to this many decimal places,
+# so runs that only differ in float noise from the subtraction still match.
+DECIMALS = 9
+
+# The calls whose coordinates follow an affine transform.
+AFFINE_CODES = frozenset([oplist.CLOSE_PATH, oplist.MOVE_TO, oplist.LINE_TO,
+                          oplist.BEZIER_TO, oplist.QUAD_TO,
+                          oplist.PATH_WINDING])
+
+# Points closer to a line than this fraction of the size of a run don't
+# span a frame.
+MIN_FRAME_EXTENT = 1e-6
+
+
+def normalize_run(stmts, start, stop):
+    """Returns a `(key, origin)` tuple of the calls in `stmts[start:stop]`, a
+    list of `(opcode, operands)` tuples.
+
+    Runs with the same hashable `key` are identical after moving them by
+    their `(x, y)` origin. Operands are compared by their rendered text, so
+    values that only differ in float noise below the printed precision are
+    treated as identical.
+    """
+    origin = None
+    key = list()
+    for code, args in stmts[start:stop]:
+        operands = list()
+        axis = 0
+        for kind, arg in zip(oplist.OPCODES[code][1], args):
+            if kind == 'c':
+                if origin is None:
+                    origin = args[:2]
+                # Adding 0.0 turns -0.0 into 0.0.
+                arg = round(arg - origin[axis], DECIMALS) + 0.0
+                axis = 1 - axis
+            operands.append(str(arg))
+        key.append((code, tuple(operands)))
+    return tuple(key), origin or (0.0, 0.0)
+
+def get_frame(points):
+    """Returns the `(a, b, c, d, e, f)` matrix mapping `(0, 0)`, `(1, 0)` and
+    `(0, 1)` to the first point and the first two further points that aren't
+    collinear with it, or `None` if all points are collinear.
+    """
+    x0, y0 = points[0]
+    size = max(math.hypot(x - x0, y - y0) for x, y in points)
+    if size == 0:
+        return None
+    axis = None
+    for x, y in points:
+        dx = x - x0
+        dy = y - y0
+        if axis is None:
+            if math.hypot(dx, dy) > MIN_FRAME_EXTENT * size:
+                axis = (dx, dy)
+        elif abs(axis[0] * dy - axis[1] * dx) > \
+                MIN_FRAME_EXTENT * math.hypot(*axis) * size:
+            return axis[0], axis[1], dx, dy, x0, y0
+    return None
+
+def normalize_affine_run(stmts, start, stop):
+    """Returns a `(key, matrix)` tuple of the calls in `stmts[start:stop]`
+    like `normalize_run()`, with coordinates in the frame of `get_frame()`.
+    Returns `None` if the run has calls other than path segments or no
+    frame.
+    """
+    points = list()
+    for code, args in stmts[start:stop]:
+        if code not in AFFINE_CODES:
+            return None
+        if code != oplist.PATH_WINDING:
+            points.extend(zip(args[0::2], args[1::2]))
+    if not points:
+        return None
+    matrix = get_frame(points)
+    if matrix is None:
+        return None
+
+    a, b, c, d, e, f = matrix
+    determinant = a * d - b * c
+    key = list()
+    for code, args in stmts[start:stop]:
+        if code == oplist.PATH_WINDING:
+            key.append((code, tuple(str(arg) for arg in args)))
+            continue
+        operands = list()
+        for x, y in zip(args[0::2], args[1::2]):
+            x -= e
+            y -= f
+            for value in ((x * d - y * c) / determinant,
+                          (a * y - b * x) / determinant):
+                operands.append(str(round(value, DECIMALS) + 0.0))
+        key.append((code, tuple(operands)))
+    return tuple(key), matrix
+
+def format_offset(name, operand):
+    """Returns the C expression of a coordinate relative to `name`."""
+    if float(operand) == 0:
+        return name
+    if operand.startswith('-'):
+        return '%s - %s' % (name, operand[1:])
+    return '%s + %s' % (name, operand)
+
+def iter_run_stmts(key, context='context'):
+    """Yields the C statements of a normalized run relative to `x` and `y`."""
+    for code, operands in key:
+        kinds = oplist.OPCODES[code][1]
+        if 'c' not in kinds:
+            for stmt in oplist.format_stmt(code, tuple(map(float, operands)),
+                                           context):
+                yield stmt
+            continue
+        expressions = list()
+        axis = 0
+        for kind, operand in zip(kinds, operands):
+            if kind == 'c':
+                expressions.append(format_offset('xy'[axis], operand))
+                axis = 1 - axis
+            else:
+                expressions.append(operand)
+        yield 'nvg%s(%s, %s);' % (oplist.OPCODES[code][0], context,
+                                  ', '.join(expressions))
+
+def iter_affine_run_stmts(key, context='context'):
+    """Yields the C statements of a run normalized by
+    `normalize_affine_run()` transformed by `a` to `f`.
+    """
+    yield 'nvgSave(%s);' % context
+    yield 'nvgTransform(%s, a, b, c, d, e, f);' % context
+    for code, operands in key:
+        for stmt in oplist.format_stmt(code, tuple(map(float, operands)),
+                                       context):
+            yield stmt
+    yield 'nvgRestore(%s);' % context
+
+
+class Subroutines(object):
+    """Collects the repeated runs of path geometry of one or more drawings."""
+
+    def __init__(self, context='context', min_length=MIN_LENGTH, prefix=''):
+        self.context = context
+        self.min_length = min_length
+        # Keeps the names of different drawings apart.
+        self.prefix = prefix
+        # Function names keyed by `(affine, key)` tuples, in order of first
+        # use.
+        self.names = collections.OrderedDict()
+        self.run_counts = collections.Counter()
+        # A list of `(start, stop, key, origin, affine)` tuples per drawing,
+        # where `affine` is the result of `normalize_affine_run()`.
+        self.drawing_runs = list()
+
+    def add(self, ops):
+        """Collects the runs of the `OpList` of a drawing."""
+        stmts = list(ops)
+        runs = list()
+        for start, stop in oplist.iter_geometry_runs(ops):
+            if stop - start >= self.min_length:
+                key, origin = normalize_run(stmts, start, stop)
+                affine = normalize_affine_run(stmts, start, stop)
+                runs.append((start, stop, key, origin, affine))
+                self.run_counts[key] += 1
+        self.drawing_runs.append(runs)
+
+    def __get_name(self, affine, key):
+        if (affine, key) not in self.names:
+            self.names[affine, key] = '%sPath%d' % (self.prefix,
+                                                    len(self.names))
+        return self.names[affine, key]
+
+    def get_replacements(self):
+        """Names the functions of the repeated runs. Returns the
+        `oplist.iter_stmts()` replacements calling them for every drawing in
+        the order added.
+        """
+        # Runs repeated at different positions don't need a transform.
+        affine_run_counts = collections.Counter(
+            affine[0] for runs in self.drawing_runs
+            for start, stop, key, origin, affine in runs
+            if self.run_counts[key] < 2 and affine is not None)
+
+        all_replacements = list()
+        for runs in self.drawing_runs:
+            replacements = dict()
+            for start, stop, key, origin, affine in runs:
+                if self.run_counts[key] >= 2:
+                    replacements[start] = (stop, '%s(%s, %s, %s);' % (
+                        self.__get_name(False, key), self.context,
+                        origin[0], origin[1]))
+                elif affine is not None and affine_run_counts[affine[0]] >= 2:
+                    affine_key, matrix = affine
+                    replacements[start] = (stop, '%s(%s, %s);' % (
+                        self.__get_name(True, affine_key), self.context,
+                        ', '.join(str(value) for value in matrix)))
+            all_replacements.append(replacements)
+        return all_replacements
+
+    def write_functions(self, output):
+        """Writes the functions named by `get_replacements()`."""
+        for (affine, key), name in self.names.items():
+            if affine:
+                output.write('static void %s(NVGcontext *%s, float a, '
+                             'float b, float c, float d, float e, float f) {\n'
+                             % (name, self.context))
+                stmts = iter_affine_run_stmts(key, self.context)
+            else:
+                output.write('static void %s(NVGcontext *%s, float x, '
+                             'float y) {\n' % (name, self.context))
+                stmts = iter_run_stmts(key, self.context)
+            for stmt in stmts:
+                output.write('  %s\n' % stmt)
+            output.write('}\n\n')
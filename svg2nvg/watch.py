@@ -0,0 +1,161 @@
+# Copyright (c) 2014 Olli Wang. All right reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Regenerates the output of SVG files as they change.
+
+The watcher polls the modification time and size of every watched file and
+only reads files whose values changed. A file is converted again only if the
+hash of its content changed, so touching a file or saving it unmodified
+neither parses it nor rewrites its output.
+"""
+
+import hashlib
+import io
+import os
+import sys
+import time
+
+from svg2nvg import command
+from svg2nvg.bundle import Bundle
+
+
+class Watcher(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.svg_paths = list()
+        self.has_conflicts = False
+        # The following are keyed by absolute path.
+        self.signatures = dict()  # (mtime, size) tuples
+        self.digests = dict()
+        # (svg_path, OpList, width, height) tuples in bundle mode.
+        self.drawings = dict()
+        self.failures = set()
+
+    def __read_if_changed(self, svg_path):
+        """Returns the content of a file if it changed since the last call,
+        or `None` otherwise.
+        """
+        key = os.path.abspath(svg_path)
+        try:
+            info = os.stat(svg_path)
+            signature = (info.st_mtime_ns, info.st_size)
+            if self.signatures.get(key) == signature:
+                return None
+            with open(svg_path, 'rb') as svg_file:
+                data = svg_file.read()
+        except OSError as error:
+            self.__fail(key, svg_path, error)
+            return None
+        self.signatures[key] = signature
+
+        digest = hashlib.sha1(data).hexdigest()
+        if self.digests.get(key) == digest:
+            return None
+        self.digests[key] = digest
+        return data
+
+    def __convert(self, svg_path, data):
+        """Converts a file from its already read content. Returns `True` on
+        success.
+        """
+        key = os.path.abspath(svg_path)
+        source = io.BytesIO(data)
+        try:
+            if self.args.bundle:
+                svg_parser = command.parse(svg_path, self.args, source=source)
+                command.report_stats(svg_parser, svg_path, self.args)
+                self.drawings[key] = (svg_path, svg_parser.ops,
+                                      svg_parser.canvas_width,
+                                      svg_parser.canvas_height)
+            else:
+                command.convert(svg_path, self.args, output=sys.stdout,
+                                source=source)
+        except Exception as error:
+            print(' !! Failed to convert %s: %s: %s' %
+                  (svg_path, error.__class__.__name__, error),
+                  file=sys.stderr)
+            self.failures.add(key)
+            return False
+        self.failures.discard(key)
+        return True
+
+    def __fail(self, key, svg_path, error):
+        """Records a file that can't be read until it can be read again."""
+        if key not in self.failures:
+            print(' !! Failed to read %s: %s' % (svg_path, error),
+                  file=sys.stderr)
+        self.__forget(key)
+        self.failures.add(key)
+
+    def __forget(self, key):
+        self.signatures.pop(key, None)
+        self.digests.pop(key, None)
+        self.drawings.pop(key, None)
+        self.failures.discard(key)
+
+    def poll(self):
+        """Converts the files that changed since the last poll. Returns the
+        number of converted files.
+        """
+        svg_paths = command.collect_svg_paths(self.args.svg_paths,
+                                              self.args.manifest)
+        if svg_paths != self.svg_paths:
+            self.svg_paths = svg_paths
+            self.has_conflicts = command.check_output_names(svg_paths,
+                                                            self.args)
+            present = set(os.path.abspath(svg_path)
+                          for svg_path in svg_paths)
+            removed = [key for key in set(self.signatures) | self.failures
+                       if key not in present]
+            for key in removed:
+                self.__forget(key)
+            changes = len(removed)
+        else:
+            changes = 0
+        if self.has_conflicts:
+            return 0
+
+        count = 0
+        for svg_path in svg_paths:
+            data = self.__read_if_changed(svg_path)
+            if data is not None and self.__convert(svg_path, data):
+                count += 1
+            changes += data is not None
+
+        # Like in batch mode, a bundle is only written if complete.
+        if self.args.bundle and changes and not self.failures:
+            bundle = Bundle(self.args.context, self.args.cull,
+                            self.args.min_subroutine_length)
+            for svg_path in svg_paths:
+                bundle.add(*self.drawings[os.path.abspath(svg_path)])
+            command.write_bundle(bundle, self.args)
+        return count
+
+    def run(self, interval):
+        """Polls every `interval` seconds until interrupted."""
+        try:
+            self.poll()
+            print('Watching %d files for changes, press Ctrl-C to stop' %
+                  len(self.svg_paths), file=sys.stderr)
+            while True:
+                time.sleep(interval)
+                start_time = time.perf_counter()
+                count = self.poll()
+                if count:
+                    print('Regenerated %d files in %.2fs' %
+                          (count, time.perf_counter() - start_time),
+                          file=sys.stderr)
+        except KeyboardInterrupt:
+            pass